@@ -1,14 +1,16 @@
 # agent.py — lightweight dispatcher that uses llm_nlu.parse_goal + tool mapping
-import llm_nlu
-from typing import Callable, Dict, Any
+import request_context
+from typing import Callable, Dict, Any, Optional
 
-def run_agent(user_id: str, user_input: str, tools: Dict[str, Callable[..., Any]]):
+def run_agent(user_id: str, user_input: str, tools: Dict[str, Callable[..., Any]], parsed: Optional[Dict] = None):
     """
-    Run the agent: parse the goal with llm_nlu.parse_goal and dispatch to the matching tool.
+    Run the agent: parse the goal with llm_nlu.parse_goal (unless `parsed` is given, or the
+    current request already parsed this text) and dispatch to the matching tool.
     tools expected keys: "add_task", "schedule_task", "complete_task", "list_tasks",
     "self_reflection", "summarize_tasks", "estimate_effort", "prioritize_tasks", "suggest_schedule" ...
     """
-    parsed = llm_nlu.parse_goal(user_input)
+    if parsed is None:
+        parsed = request_context.parse(user_input)
     intent = parsed.get("intent")
 
     # schedule_task -> planner (planner returns dict with scheduled True/False)
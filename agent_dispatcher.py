@@ -1,14 +1,18 @@
 
 from typing import Dict, Callable
 from observability import emit_event
+import metrics
 import personas
 from connectors.calendar_connector import CalendarConnector
 from connectors.github_connector import GitHubConnector
 from connectors.messaging_connector import MessagingConnector
 import tools
 from response_formatter import format_response
+from task_memory import resolve_memory
 
 def get_tool_mapping(persona_id: str, memory, calendar_client=None):
+    # `memory` is either a single TaskMemory or a TaskMemoryManager; each tool
+    # resolves the caller's shard from its uid argument.
 
     persona_cfg = personas.PERSONAS.get(persona_id, personas.PERSONAS["default"])
 
@@ -18,15 +22,16 @@ def get_tool_mapping(persona_id: str, memory, calendar_client=None):
 
     def add_task(uid, title, est, prio):
         try:
-            task = memory.add_task(title=title,
-                                   estimated_minutes=int(est or persona_cfg["default_duration_minutes"]),
-                                   priority=int(prio or 3))
+            mem = resolve_memory(memory, uid)
+            task = mem.add_task(title=title,
+                                estimated_minutes=int(est or persona_cfg["default_duration_minutes"]),
+                                priority=int(prio or 3))
             emit_event("tool_call:add_task", {"user": uid, "task": task.to_dict(), "persona": persona_cfg["id"]})
             
             if persona_cfg.get("auto_create_issue") and "github" in persona_cfg.get("enabled_tools", []):
                 try:
                     issue = gh.create_issue(uid, f"{uid}/auto", task.title, "")
-                    gh.link_task_to_issue(memory, task.id, issue)
+                    gh.link_task_to_issue(mem, task.id, issue)
                     emit_event("auto_issue_created", {"user": uid, "issue": issue, "task_id": task.id})
                 except Exception:
                     pass
@@ -37,18 +42,20 @@ def get_tool_mapping(persona_id: str, memory, calendar_client=None):
 
     def complete_task(uid, task_id):
         try:
-            memory.complete_task(task_id)
+            resolve_memory(memory, uid).complete_task(task_id)
             emit_event("tool_call:complete_task", {"user": uid, "task_id": task_id, "persona": persona_cfg["id"]})
             return {"message": "✅ Task completed."}
         except Exception as e:
             emit_event("tool_call_error:complete_task", {"user": uid, "task_id": task_id, "error": str(e)})
             raise
 
-    def list_tasks(uid, status=None):
+    def list_tasks(uid, status=None, limit=None, cursor=None, fields=None, start_from=None, start_to=None):
         try:
-            tasks = memory.list_all() if not status else memory.list_by_status(status)
+            mem = resolve_memory(memory, uid)
+            tasks, next_cursor = mem.page(limit=int(limit) if limit else None, cursor=cursor, status=status,
+                                          start_from=start_from, start_to=start_to, fields=fields)
             emit_event("tool_call:list_tasks", {"user": uid, "count": len(tasks)})
-            return {"tasks": tasks}
+            return {"tasks": tasks, "next_cursor": next_cursor}
         except Exception as e:
             emit_event("tool_call_error:list_tasks", {"user": uid, "error": str(e)})
             raise
@@ -56,7 +63,7 @@ def get_tool_mapping(persona_id: str, memory, calendar_client=None):
     def self_reflection(uid):
         try:
             from self_reflection import reflect as reflect_fn
-            res = reflect_fn(uid, memory, cal.client)
+            res = reflect_fn(uid, resolve_memory(memory, uid), cal.client)
             emit_event("tool_call:self_reflection", {"user": uid})
             return res
         except Exception as e:
@@ -66,7 +73,7 @@ def get_tool_mapping(persona_id: str, memory, calendar_client=None):
     def schedule_task(uid, parsed):
         try:
             from planner import Planner
-            planner = Planner(cal.client, memory, default_work_hours=persona_cfg.get("preferred_work_hours"),
+            planner = Planner(cal.client, resolve_memory(memory, uid), default_work_hours=persona_cfg.get("preferred_work_hours"),
                               scheduling_strategy=persona_cfg.get("scheduling_strategy"),
                               deep_work_minutes=persona_cfg.get("deep_work_minutes"))
             res = planner.schedule_task_from_parsed(uid, parsed)
@@ -79,12 +86,13 @@ def get_tool_mapping(persona_id: str, memory, calendar_client=None):
     def create_issue_and_task(uid, repo, title, body=""):
         try:
             issue = gh.create_issue(uid, repo, title, body)
-            task = memory.add_task(title=title,
-                                   estimated_minutes=persona_cfg["default_duration_minutes"],
-                                   priority=3)
+            mem = resolve_memory(memory, uid)
+            task = mem.add_task(title=title,
+                                estimated_minutes=persona_cfg["default_duration_minutes"],
+                                priority=3)
            
             try:
-                gh.link_task_to_issue(memory, task.id, issue)
+                gh.link_task_to_issue(mem, task.id, issue)
             except Exception:
                 pass
             emit_event("tool_call:create_issue_and_task", {"user": uid, "issue": issue, "task_id": task.id})
@@ -115,13 +123,13 @@ def get_tool_mapping(persona_id: str, memory, calendar_client=None):
         return {"message": msg, "estimate": res}
 
     def prioritize_tasks_tool(uid, horizon_days=7):
-        res = tools.prioritize_tasks(memory, uid, horizon_days=horizon_days, persona_cfg=persona_cfg)
+        res = tools.prioritize_tasks(resolve_memory(memory, uid), uid, horizon_days=horizon_days, persona_cfg=persona_cfg)
         emit_event("tool_call:prioritize_tasks", {"user": uid, "horizon_days": horizon_days})
         msg = format_response(persona_cfg, "Here are the prioritized tasks.", details={"tasks": res.get("tasks", [])})
         return {"message": msg, "prioritization": res}
 
     def suggest_schedule_tool(uid, duration_minutes=60, preference=None):
-        res = tools.suggest_schedule(memory, cal.client, uid, duration_minutes=duration_minutes, preference=preference or persona_cfg.get("scheduling_strategy"))
+        res = tools.suggest_schedule(resolve_memory(memory, uid), cal.client, uid, duration_minutes=duration_minutes, preference=preference or persona_cfg.get("scheduling_strategy"))
         emit_event("tool_call:suggest_schedule", {"user": uid, "duration_minutes": duration_minutes, "preference": preference})
         if res.get("error"):
             return {"message": f"Could not find a slot: {res.get('error')}", "error": res.get("error")}
@@ -146,5 +154,5 @@ def get_tool_mapping(persona_id: str, memory, calendar_client=None):
     tool_mapping["estimate_effort"] = estimate_effort_tool
     tool_mapping["prioritize_tasks"] = prioritize_tasks_tool
     tool_mapping["suggest_schedule"] = suggest_schedule_tool
-    
-    return tool_mapping
\ No newline at end of file
+
+    return {name: metrics.instrument_tool(name, fn, persona_cfg["id"]) for name, fn in tool_mapping.items()}
\ No newline at end of file
@@ -6,17 +6,23 @@ load_dotenv()
 import logging
 import traceback
 import json
+import zlib
 from datetime import datetime
-from fastapi import FastAPI, Request, Query, BackgroundTasks, HTTPException
+from typing import List
+from fastapi import FastAPI, Request, Response, Query, BackgroundTasks, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from task_memory import TaskMemory
+from task_memory import TaskMemoryManager
 from planner import Planner
 from calendar_mock import CalendarMock
 from self_reflection import reflect as reflect_fn
+import observability
+import metrics
 from observability import emit_event
 import agent
 import tools
 import llm_nlu
+import request_context
 
 from agent_dispatcher import get_tool_mapping
 import personas
@@ -52,23 +58,46 @@ else:
     logger.info("OpenAI disabled (USE_OPENAI not set).")
 
 app = FastAPI(title="AI Personal Productivity Assistant")
+app.add_middleware(observability.EventScopeMiddleware)
+app.add_middleware(metrics.TraceMiddleware)
 
-memory = TaskMemory()
+memories = TaskMemoryManager()
 calendar_client = CalendarMock()
-planner = Planner(calendar_client, memory)
 
 app.state.awaiting_time_for = {}
 app.state.last_agent_result = None
 
+@app.on_event("shutdown")
+def _flush_task_memory():
+    memories.close()
+    observability.shutdown()
+
 class ActRequest(BaseModel):
     user_id: str
     goal: str
     persona: str = None
     task_id: str = None
 
+class BulkTaskItem(BaseModel):
+    title: str
+    priority: int = 3
+    estimated_minutes: int = 60
+    pending_time: bool = False
+
+class BulkTasksRequest(BaseModel):
+    user_id: str
+    tasks: List[BulkTaskItem]
+
+class BulkCompleteRequest(BaseModel):
+    user_id: str
+    task_ids: List[str]
+
 def _bg_schedule_and_update(user_id: str, parsed: dict, created_task_id: str):
     try:
-        result = planner.schedule_task_from_parsed(user_id, parsed)
+        memory = memories.for_user(user_id)
+        planner = Planner(calendar_client, memory)
+        with metrics.span("planner_schedule"):
+            result = planner.schedule_task_from_parsed(user_id, parsed)
         if isinstance(result, dict) and result.get("scheduled"):
             start, end = result.get("start"), result.get("end")
             if created_task_id:
@@ -131,7 +160,7 @@ def run_openai_function_call(user_id: str, user_input: str, persona_id: str, too
                     result = fn(user_id, **args)
                 except TypeError:
                     try:
-                        result = fn(memory, user_id, **args)
+                        result = fn(memories.for_user(user_id), user_id, **args)
                     except TypeError:
                         result = fn(user_id, *(args.values()))
                 return {"function": {"name": name, "args": args, "result": result}}
@@ -163,7 +192,9 @@ async def list_mcp_functions(persona: str = Query(None)):
         return {"status": "error", "message": str(e)}
 
 @app.api_route("/mcp/act", methods=["GET", "POST"])
+@metrics.traced("mcp_act")
 async def act(request: Request, background_tasks: BackgroundTasks, user_id: str = Query(None), goal: str = Query(None), persona: str = Query(None)):
+    ctx = None
     try:
         provided_task_id = None
         if request.method == "POST":
@@ -177,17 +208,23 @@ async def act(request: Request, background_tasks: BackgroundTasks, user_id: str
 
         if not user_id or not user_input:
             return {"status": "error", "message": "Missing user_id or goal."}
+        memory = memories.for_user(user_id)
+        metrics.tag(persona=persona if persona in personas.PERSONAS else "default")
 
         emit_event("user_input", {"user": user_id, "text": user_input, "persona": persona, "provided_task_id": bool(provided_task_id)})
+        ctx = request_context.start(user_id, user_input, persona)
 
         task_id_to_use = provided_task_id or app.state.awaiting_time_for.get(user_id)
         if task_id_to_use:
-            parsed = tools.parse_time(user_input)
+            metrics.tag(intent="provide_time")
+            with metrics.span("parse_time"):
+                parsed = tools.parse_time(user_input)
             if not parsed:
                 return {"status": "ok", "result": {"message": "I didn’t catch the time. Try 'tomorrow 11am'."}}
             start, end = parsed["start"], parsed["end"]
             try:
-                memory.schedule_task(task_id_to_use, start, end)
+                with metrics.span("schedule_task"):
+                    memory.schedule_task(task_id_to_use, start, end)
             except Exception as e:
                 logger.exception("Scheduling failed for task_id %s: %s", task_id_to_use, e)
                 if app.state.awaiting_time_for.get(user_id) == task_id_to_use:
@@ -199,11 +236,14 @@ async def act(request: Request, background_tasks: BackgroundTasks, user_id: str
             emit_event("task_scheduled", {"user": user_id, "task_id": task_id_to_use, "start": start, "end": end})
             return {"status": "ok", "result": {"message": f"✅ Scheduled '{task.title}' from {start} to {end}.", "task": task.to_dict(), "scheduled": True}}
 
-        parsed_quick = llm_nlu.parse_goal(user_input)
+        with metrics.span("parse_goal"):
+            parsed_quick = ctx.parse()
+        metrics.tag(intent=parsed_quick.get("intent") or "unknown")
         if parsed_quick.get("intent") == "schedule_task":
             title = parsed_quick.get("title") or parsed_quick.get("raw", "Focused work")
             estimated = parsed_quick.get("duration_minutes") or 60
-            task = memory.add_task(title=title, estimated_minutes=int(estimated), priority=int(parsed_quick.get("priority", 3)), pending_time=True)
+            with metrics.span("add_task"):
+                task = memory.add_task(title=title, estimated_minutes=int(estimated), priority=int(parsed_quick.get("priority", 3)), pending_time=True)
 
             if getattr(task, "deduped", False):
                 return {"status": "ok", "result": {"message": f"I already added '{task.title}' recently. I'll use that one.", "task": task.to_dict(), "needs_time": True, "task_id": task.id}}
@@ -214,8 +254,10 @@ async def act(request: Request, background_tasks: BackgroundTasks, user_id: str
 
         ui_lower = user_input.lower()
         if "summarize" in ui_lower or "summary" in ui_lower:
+            metrics.tag(intent="summarize_tasks")
             try:
-                summary = tools.summarize_tasks(memory, user_id, scope="all")
+                with metrics.span("summarize_tasks"):
+                    summary = tools.summarize_tasks(memory, user_id, scope="all")
                 if "message" not in summary:
                     summary["message"] = summary.get("message") or f"Summary: {summary.get('counts', {}).get('total', len(memory.list_all()))} tasks."
                 return {"status": "ok", "result": summary}
@@ -224,8 +266,10 @@ async def act(request: Request, background_tasks: BackgroundTasks, user_id: str
                 return {"status": "ok", "result": {"message": f"Could not summarize tasks: {e}"}}
 
         if "estimate" in ui_lower or "effort" in ui_lower:
+            metrics.tag(intent="estimate_effort")
             try:
-                estimate = tools.estimate_effort(memory, user_id, task_ids=[])
+                with metrics.span("estimate_effort"):
+                    estimate = tools.estimate_effort(memory, user_id, task_ids=[])
                 msg = f"Estimated pending effort: {estimate.get('total_minutes',0)} minutes across {estimate.get('tasks_counted',0)} tasks. Recommended blocks: {estimate.get('recommended_blocks',0)}."
                 estimate["message"] = msg
                 return {"status": "ok", "result": estimate}
@@ -237,21 +281,28 @@ async def act(request: Request, background_tasks: BackgroundTasks, user_id: str
         if persona_id not in personas.PERSONAS:
             persona_id = "default"
 
-        tool_mapping = get_tool_mapping(persona_id, memory, calendar_client=calendar_client)
+        with metrics.span("tool_mapping"):
+            tool_mapping = get_tool_mapping(persona_id, memories, calendar_client=calendar_client)
 
-        if OPENAI_AVAILABLE:
-            func_result = run_openai_function_call(user_id, user_input, persona_id, tool_mapping)
+        # one model round trip per message: when the parse already came from the model,
+        # route its result instead of asking the model again via function calling
+        if OPENAI_AVAILABLE and not (ctx.parsed_by_model or ctx.model_calls):
+            with metrics.span("openai_function_call"):
+                ctx.model_call("function_call")
+                func_result = run_openai_function_call(user_id, user_input, persona_id, tool_mapping)
             if func_result is not None:
                 return {"status": "ok", "result": func_result}
 
-        result = agent.run_agent(user_id, user_input, tool_mapping)
+        with metrics.span("run_agent"):
+            result = agent.run_agent(user_id, user_input, tool_mapping, parsed=ctx.parse())
         app.state.last_agent_result = result
 
         if isinstance(result, dict) and result.get("intent") == "add_task":
             title = result.get("title") or "Untitled task"
             parsed = result.get("parsed", {}) or {}
             estimated_minutes = parsed.get("estimated_minutes", 60)
-            task = memory.add_task(title=title, priority=3, estimated_minutes=estimated_minutes, pending_time=True)
+            with metrics.span("add_task"):
+                task = memory.add_task(title=title, priority=3, estimated_minutes=estimated_minutes, pending_time=True)
             if getattr(task, "deduped", False):
                 return {"status": "ok", "result": {"needs_time": True, "title": task.title, "task_id": task.id, "message": f"I already added '{task.title}' recently. I'll use that one. When should I schedule it?"}}
             app.state.awaiting_time_for[user_id] = task.id
@@ -272,37 +323,112 @@ async def act(request: Request, background_tasks: BackgroundTasks, user_id: str
         except Exception:
             pass
         return {"status": "error", "message": "Internal server error."}
+    finally:
+        request_context.finish(ctx)
+
+@app.get("/metrics")
+async def get_metrics():
+    for name, value in observability.stats().items():
+        if isinstance(value, (int, float)):
+            metrics.set_gauge("events", value, state=name)
+    for name, value in llm_nlu.cache.stats().items():
+        metrics.set_gauge("parse_cache", value, stat=name)
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/tasks")
-async def get_tasks():
-    return {"status": "ok", "result": {"tasks": memory.list_all()}}
+async def get_tasks(request: Request, response: Response, user_id: str = Query(None), limit: int = Query(None, ge=1, le=1000), cursor: str = Query(None),
+                    status: str = Query(None), start_from: str = Query(None), start_to: str = Query(None),
+                    fields: str = Query(None)):
+    if not user_id:
+        raise HTTPException(status_code=400, detail="Missing user_id")
+    memory = memories.for_user(user_id)
+    version = memory.version_token()
+    etag = f'W/"{version}-{zlib.crc32(str(request.query_params).encode("utf-8")):08x}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    try:
+        tasks, next_cursor = memory.page(limit=limit, cursor=cursor, status=status,
+                                         start_from=start_from, start_to=start_to,
+                                         fields=field_list)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers["ETag"] = etag
+    return {"status": "ok", "result": {"tasks": tasks, "next_cursor": next_cursor, "version": version}}
+
+@app.get("/tasks/changes")
+async def get_task_changes(user_id: str = Query(None), since: str = Query(None)):
+    if not user_id:
+        raise HTTPException(status_code=400, detail="Missing user_id")
+    return {"status": "ok", "result": memories.for_user(user_id).changes_since(since)}
+
+@app.get("/tasks/history")
+async def get_task_history(user_id: str = Query(None), since: str = Query(None), until: str = Query(None)):
+    """Archived (completed) tasks as newline-delimited JSON, streamed straight from the archive."""
+    if not user_id:
+        raise HTTPException(status_code=400, detail="Missing user_id")
+    memory = memories.for_user(user_id)
+    try:
+        archived = memory.iter_archived(since=since, until=until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    lines = (json.dumps(t) + "\n" for t in archived)
+    return StreamingResponse(lines, media_type="application/x-ndjson")
 
 @app.post("/tasks/{task_id}/complete")
-async def complete_task_endpoint(task_id: str):
+async def complete_task_endpoint(task_id: str, user_id: str = Query(None)):
+    if not user_id:
+        raise HTTPException(status_code=400, detail="Missing user_id")
     try:
-        memory.complete_task(task_id)
+        memories.for_user(user_id).complete_task(task_id)
         try:
-            emit_event("task_completed_api", {"task_id": task_id})
+            emit_event("task_completed_api", {"user": user_id, "task_id": task_id})
         except Exception:
             pass
         return {"status": "ok", "result": {"message": "✅ Task marked done", "task_id": task_id}}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/tasks/bulk")
+async def bulk_add_tasks(req: BulkTasksRequest):
+    memory = memories.for_user(req.user_id)
+    with memory.batch():
+        tasks = [memory.add_task(title=item.title, priority=item.priority,
+                                 estimated_minutes=item.estimated_minutes, pending_time=item.pending_time)
+                 for item in req.tasks]
+    return {"status": "ok", "result": {"tasks": [t.to_dict() for t in tasks]}}
+
+@app.post("/tasks/complete")
+async def bulk_complete_tasks(req: BulkCompleteRequest):
+    memory = memories.for_user(req.user_id)
+    completed, missing = [], []
+    with memory.batch():
+        for task_id in req.task_ids:
+            try:
+                memory.complete_task(task_id)
+                completed.append(task_id)
+            except ValueError:
+                missing.append(task_id)
+    try:
+        emit_event("tasks_completed_api", {"user": req.user_id, "count": len(completed), "missing": missing})
+    except Exception:
+        pass
+    return {"status": "ok", "result": {"message": f"✅ {len(completed)} tasks marked done", "completed": completed, "missing": missing}}
+
 @app.get("/mcp/reflect")
 async def reflect_endpoint(user_id: str = Query(None)):
     if not user_id:
         raise HTTPException(status_code=400, detail="Missing user_id")
     try:
-        tasks = memory.list_all()
-        completed = [t for t in tasks if t.get("status") == "done"]
-        pending = [t for t in tasks if t.get("status") != "done"]
-        pending_ids = [t["id"] for t in pending]
+        memory = memories.for_user(user_id)
+        completed = memory.list_by_status("done")
+        pending = memory.list_open()
         try:
             from tools import estimate_effort
-            estimate = estimate_effort(memory, user_id, pending_ids)
+            estimate = estimate_effort(memory, user_id)
         except Exception:
-            estimate = {"total_minutes": sum(t.get("estimated_minutes", 60) for t in pending), "recommended_blocks": 0, "tasks_counted": len(pending)}
+            total_minutes, tasks_counted = memory.open_effort()
+            estimate = {"total_minutes": total_minutes, "recommended_blocks": 0, "tasks_counted": tasks_counted}
         message = f"Self-reflection: ✅ Completed: {len(completed)} • ⏳ Pending: {len(pending)}. Estimated pending effort: {estimate.get('total_minutes', 0)} min."
         return {
             "status": "ok",
@@ -0,0 +1,163 @@
+"""
+Throughput benchmark and parity check for nlu.parse_goal.
+
+Builds a corpus from the user_input texts in the event log (plus a few
+generated variants for branches the log may not cover), checks that the
+compiled matcher returns exactly what the previous keyword-scan
+implementation returned, and reports parses per second for both:
+
+    python bench_nlu.py --log events.log --rounds 20
+"""
+import argparse
+import os
+import re
+import time
+from datetime import datetime
+
+from dateutil import parser as dateparser
+
+import nlu
+
+
+def legacy_parse_goal(text: str, ref: datetime = None):
+    """The keyword-scan parse_goal this module's matcher replaced, kept verbatim for comparison."""
+    ref = ref or datetime.utcnow()
+    t = (text or "").strip().lower()
+    out = {"intent": "unknown", "raw": text}
+
+    if any(kw in t for kw in ("done", "complete", "mark done", "finished")):
+        out["intent"] = "mark_done"
+        m = re.search(r"[0-9a-fA-F\-]{8,36}", text)
+        if m:
+            out["task_id"] = m.group(0)
+        return out
+
+    if any(kw in t for kw in ("list tasks", "show tasks", "what are my tasks", "my tasks")):
+        out["intent"] = "list_tasks"
+        return out
+
+    if any(kw in t for kw in ("reflect", "self-reflection", "how did i do", "review")):
+        out["intent"] = "self_reflection"
+        return out
+
+    if any(kw in t for kw in ("summarize", "summary", "summarise")):
+        out["intent"] = "summarize_tasks"
+        return out
+    if any(kw in t for kw in ("estimate", "effort", "how long")):
+        out["intent"] = "estimate_effort"
+        ids = re.findall(r"[0-9a-fA-F\-]{8,36}", text)
+        if ids:
+            out["task_ids"] = ids
+        return out
+    if any(kw in t for kw in ("prioritize", "prioritise", "prioritiz")):
+        out["intent"] = "prioritize_tasks"
+        return out
+    if "suggest" in t and "schedule" in t:
+        out["intent"] = "suggest_schedule"
+        m = re.search(r"(\d+)\s*(h|hr|hour|m|min)", text)
+        if m:
+            val = int(m.group(1))
+            out["duration_minutes"] = val * 60 if m.group(2).startswith("h") else val
+        return out
+
+    if any(kw in t for kw in ("schedule", "schedule a", "meeting", "appointment", "tomorrow", "today", "at ", "pm", "am", "on ")):
+        out["intent"] = "schedule_task"
+        title = re.sub(r"\b(schedule|set|a|for|tomorrow|today|at|on|in|meeting|appointment)\b", "", t, flags=re.I).strip()
+        out["title"] = title or None
+        try:
+            dt = dateparser.parse(text, default=ref)
+            if dt:
+                out["date"] = dt.isoformat()
+        except Exception:
+            pass
+        m = re.search(r"(\d+)\s*(h|hr|hour|m|min)", text)
+        if m:
+            val = int(m.group(1))
+            if m.group(2).startswith("h"):
+                out["duration_minutes"] = val * 60
+            else:
+                out["duration_minutes"] = val
+        else:
+            out["duration_minutes"] = 60
+        out["estimated_minutes"] = out.get("duration_minutes", 60)
+        return out
+
+    if any(kw in t for kw in ("add", "create", "todo", "remind", "schedule")) and not any(kw in t for kw in ("tomorrow","today","at","pm","am","on")):
+        out["intent"] = "add_task"
+        m = re.sub(r"^(add|create|todo|remind me to)\s*", "", text, flags=re.I).strip()
+        out["title"] = m or text
+        out["estimated_minutes"] = 60
+        out["priority"] = 3
+        return out
+
+    out["intent"] = "add_task"
+    out["title"] = text
+    out["estimated_minutes"] = 60
+    out["priority"] = 3
+    return out
+
+
+EXTRA = [
+    "", "   ", "Mark Done 1b2c3d4e-aaaa-bbbb-cccc-0123456789ab", "show tasks please", "What are my tasks?",
+    "self-reflection time", "how did i do this week", "summarise my week", "how long will 12ab34cd take",
+    "prioritise for next 3 days", "suggest a schedule for 90 min", "suggest schedule 2h", "schedule a call",
+    "Meeting with Bob at 3pm for 45 min", "dentist appointment on friday", "remind me to water plants",
+    "create quarterly report", "todo: buy milk", "add lunch", "add cat food", "read a book", "call mom",
+    "reviewing code", "Create report on sales", "add something important", "plan vacation", "STANDUP TOMORROW 9AM",
+]
+
+
+def build_corpus(log_file: str):
+    import event_log
+
+    texts = []
+    try:
+        for event in event_log.iter_events(log_file, ["user_input"]):
+            text = (event.get("payload") or {}).get("text")
+            if isinstance(text, str):
+                texts.append(text)
+    except OSError:
+        pass
+    variants = [v for t in texts[:200] for v in (t.upper(), "  " + t + "  ", t + " 2h")]
+    return texts + EXTRA + variants
+
+
+def _rates(fns, corpus, ref, rounds, repeat=7):
+    """Best-of-`repeat` parses/s for each fn; the fns alternate within a repeat so load drift hits both."""
+    best = [None] * len(fns)
+    for _ in range(repeat):
+        for i, fn in enumerate(fns):
+            started = time.perf_counter()
+            for _ in range(rounds):
+                for text in corpus:
+                    fn(text, ref)
+            elapsed = time.perf_counter() - started
+            best[i] = elapsed if best[i] is None else min(best[i], elapsed)
+    return [rounds * len(corpus) / b for b in best]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--log", default=os.environ.get("OBS_LOG_FILE", "events.log"))
+    ap.add_argument("--rounds", type=int, default=20)
+    args = ap.parse_args()
+
+    corpus = build_corpus(args.log)
+    ref = datetime(2024, 1, 15, 9, 30)
+    mismatches = [(t, legacy_parse_goal(t, ref), nlu.parse_goal(t, ref)) for t in corpus
+                  if legacy_parse_goal(t, ref) != nlu.parse_goal(t, ref)]
+    for text, old, new in mismatches[:10]:
+        print(f"MISMATCH {text!r}\n  legacy:   {old}\n  compiled: {new}")
+    print(f"corpus: {len(corpus)} texts, {len(set(corpus))} distinct, mismatches: {len(mismatches)}")
+
+    # inputs that never reach dateutil, then the whole corpus (schedule_task parses call dateutil)
+    no_dates = [t for t in corpus if legacy_parse_goal(t, ref)["intent"] != "schedule_task"]
+    for label, texts in (("non-schedule inputs", no_dates), ("all inputs", corpus)):
+        old, new = _rates((legacy_parse_goal, nlu.parse_goal), texts, ref, args.rounds)
+        print(f"{label:20s} legacy {old:10.0f}/s  compiled {new:10.0f}/s  x{new / old:.2f}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Differential check and micro-benchmark for tools.parse_time.
+
+Compares the grammar fast path against the previous dateutil-only
+implementation on a corpus of time replies (the user_input texts in the
+event log plus generated relative forms and misspellings):
+
+  * inputs the grammar declines must give exactly the previous result,
+    since they take the same dateutil path;
+  * EXPECTED pins what the grammar returns for the common forms;
+  * inputs where the grammar and the previous implementation disagree are
+    counted, and listed with --diffs.
+
+    python bench_parse_time.py --log events.log --rounds 20 --diffs
+"""
+import argparse
+import os
+import re
+import time
+from datetime import datetime, timedelta
+
+from dateutil import parser as dateparser
+
+import time_grammar
+import tools
+
+# a Monday, mid-morning, with seconds set so leaked "now" components show up
+NOW = datetime(2024, 1, 15, 10, 17, 43)
+
+
+def legacy_parse_time(text, now=None):
+    """tools.parse_time before the grammar fast path, kept verbatim for comparison."""
+    if not text or not text.strip():
+        return None
+    now = now or datetime.now()
+    txt = text.strip().lower()
+    txt = re.sub(r'\bon\b\s+on\b', ' on', txt)
+    txt = re.sub(r'\s+', ' ', txt)
+    txt = txt.replace(',', ' ')
+    parsed = None
+    try:
+        parsed = dateparser.parse(txt, default=now, fuzzy=True)
+    except Exception:
+        parsed = None
+    if not parsed:
+        try:
+            parsed = dateparser.parse(txt, default=now)
+        except Exception:
+            parsed = None
+    if not parsed:
+        if "tomorrow" in txt:
+            parsed = now + timedelta(days=1)
+            parsed = parsed.replace(hour=11, minute=0, second=0, microsecond=0)
+        elif "today" in txt:
+            parsed = now.replace(hour=11, minute=0, second=0, microsecond=0)
+        else:
+            return None
+
+    if parsed.hour == 0 and parsed.minute == 0 and ":" not in txt and "am" not in txt and "pm" not in txt:
+        parsed = parsed.replace(hour=11, minute=0, second=0, microsecond=0)
+    start = parsed
+    end = start + timedelta(hours=1)
+    return {"start": start.isoformat(), "end": end.isoformat()}
+
+
+EXPECTED = {
+    "tomorrow 3pm": "2024-01-16T15:00:00",
+    "tommorow 11 am": "2024-01-16T11:00:00",
+    "Tomorow at 9:15 pm": "2024-01-16T21:15:00",
+    "tmrw @ noon": "2024-01-16T12:00:00",
+    "next mon 9:30": "2024-01-22T09:30:00",
+    "monday 2pm": "2024-01-15T14:00:00",
+    "wendesday 10am": "2024-01-17T10:00:00",
+    "thrusday evening": "2024-01-18T18:00:00",
+    "on friday, 4 p.m.": "2024-01-19T16:00:00",
+    "in 2 hours": "2024-01-15T12:17:00",
+    "in an hour": "2024-01-15T11:17:00",
+    "in 30 mins": "2024-01-15T10:47:00",
+    "today evening": "2024-01-15T18:00:00",
+    "this afternoon": "2024-01-15T14:00:00",
+    "tonight": "2024-01-15T20:00:00",
+    "tomorrow morning 8": "2024-01-16T08:00:00",
+    "day after tomorrow": "2024-01-17T11:00:00",
+    "today": "2024-01-15T11:00:00",
+    "3pm": "2024-01-15T15:00:00",
+    "12am tomorrow": "2024-01-16T00:00:00",
+    # outside the grammar: previous behaviour
+    "jan 20 3pm": "2024-01-20T15:17:43",
+    "2024-02-01 10:00": "2024-02-01T10:00:43",
+    "tomorrow 3": "2024-01-03T10:17:43",
+    # spelled-out hours and look-alikes of period words are declined, never read as "night"
+    "tomorrow at eight": "2024-01-16T11:00:00",
+    "eight": None,
+    "might work": None,
+}
+
+DAYS = ["today", "tomorrow", "tommorow", "tmrw", "monday", "next mon", "fri", "thrusday", "this evening", ""]
+TIMES = ["3pm", "11 am", "9:30", "at 10:15am", "noon", "evening", "", "7 p.m."]
+OTHER = ["in 2 hours", "in 45 min", "in a week", "in 3 days", "10 june", "at 2 jan on 3 pm", "sometime",
+         "whenever works", "15:30", "13pm", "2pm-3pm", "next week", "asap"]
+
+
+def build_corpus(log_file: str):
+    import event_log
+
+    texts = []
+    try:
+        for event in event_log.iter_events(log_file, ["user_input"]):
+            text = (event.get("payload") or {}).get("text")
+            if isinstance(text, str):
+                texts.append(text)
+    except OSError:
+        pass
+    generated = [f"{d} {t}".strip() for d in DAYS for t in TIMES if d or t] + OTHER
+    return texts + generated + list(EXPECTED)
+
+
+def _rate(fn, corpus, rounds, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for text in corpus:
+                fn(text, NOW)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return rounds * len(corpus) / best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--log", default=os.environ.get("OBS_LOG_FILE", "events.log"))
+    ap.add_argument("--rounds", type=int, default=20)
+    ap.add_argument("--diffs", action="store_true", help="list inputs the grammar reads differently")
+    args = ap.parse_args()
+
+    failures = 0
+    for text, want in EXPECTED.items():
+        got = tools.parse_time(text, NOW)
+        if (got or {}).get("start") != want:
+            failures += 1
+            print(f"EXPECTED {text!r}: want {want}, got {got}")
+
+    corpus = build_corpus(args.log)
+    handled, changed = 0, []
+    for text in dict.fromkeys(corpus):
+        old, new = legacy_parse_time(text, NOW), tools.parse_time(text, NOW)
+        if time_grammar.parse(text, NOW) is None:
+            if old != new:
+                failures += 1
+                print(f"FALLBACK MISMATCH {text!r}: legacy {old}, now {new}")
+            continue
+        handled += 1
+        if old != new:
+            changed.append((text, (old or {}).get("start"), new["start"]))
+    distinct = len(set(corpus))
+    print(f"corpus: {len(corpus)} texts, {distinct} distinct, {handled} handled by the grammar, "
+          f"{len(changed)} of those differ from legacy, failures: {failures}")
+    for text, old, new in changed if args.diffs else ():
+        print(f"  {text!r:28s} legacy {old or '-':20s} grammar {new}")
+
+    replies = [t for t in corpus if time_grammar.parse(t, NOW) is not None]
+    for label, texts in (("grammar-handled", replies), ("all inputs", corpus)):
+        old = _rate(legacy_parse_time, texts, args.rounds)
+        new = _rate(tools.parse_time, texts, args.rounds)
+        print(f"{label:16s} legacy {old:10.0f}/s  fast path {new:10.0f}/s  x{new / old:.2f}")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
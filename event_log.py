@@ -0,0 +1,246 @@
+"""
+Rotated, compressed segments of the local event log (events.log).
+
+When observability rotates the live log it is renamed to
+`<log>.<UTC timestamp>` and then compressed into `<log>.<timestamp>.gz` as a
+series of independent gzip members of INDEX_CHUNK_EVENTS lines each. Every
+member gets one line in the sidecar index `<log>.index`:
+
+    {"segment": "events.log.20240102T030405.gz", "offset": 0, "length": 5120,
+     "start": "...", "end": "...", "count": 1000, "names": ["task_added", ...]}
+
+iter_events() uses the index to seek straight to the members that can match
+a name/time filter, then falls back to scanning segments still waiting for
+compression and the live log.
+
+With several worker processes, only the process that rotated a segment (or
+finds it left over at startup) compresses it, and compress_segment claims it
+with a flock on `<segment>.lock` first, so a segment is indexed once.
+"""
+import glob
+import gzip
+import json
+import logging
+import os
+import re
+import tempfile
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, only one process may compress
+    fcntl = None
+
+logger = logging.getLogger("event_log")
+
+INDEX_CHUNK_EVENTS = int(os.environ.get("OBS_INDEX_CHUNK_EVENTS", "1000"))
+
+_SEGMENT_RE = re.compile(r"\.(\d{8}T\d{6})(?:-(\d+))?$")
+
+
+def index_path(log_file: str) -> str:
+    return f"{log_file}.index"
+
+
+def rotate(log_file: str) -> Optional[str]:
+    """Rename the live log to a timestamped segment; returns its path, or None if there was nothing to rotate."""
+    if not os.path.exists(log_file) or os.path.getsize(log_file) == 0:
+        return None
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    segment = f"{log_file}.{stamp}"
+    n = 1
+    while os.path.exists(segment) or os.path.exists(segment + ".gz"):
+        segment = f"{log_file}.{stamp}-{n}"
+        n += 1
+    os.replace(log_file, segment)
+    return segment
+
+
+def pending_segments(log_file: str) -> List[str]:
+    """Rotated segments that haven't been compressed yet, oldest first."""
+    found = []
+    for path in glob.glob(glob.escape(log_file) + ".*"):
+        m = _SEGMENT_RE.search(path)
+        if m:
+            found.append((m.group(1), int(m.group(2) or 0), path))
+    return [path for _, _, path in sorted(found)]
+
+
+def _indexed_segments(log_file: str) -> set:
+    return {entry["segment"] for entry in read_index(log_file)}
+
+
+def compress_segment(segment: str, log_file: str) -> bool:
+    """
+    Compress a rotated segment into indexed gzip members, then remove the plain file.
+    Returns False if another process is compressing it; the caller should leave it alone.
+    """
+    lock_path = segment + ".lock"
+    with open(lock_path, "a") as lock:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+        try:
+            # the holder before us may have finished it already
+            if os.path.exists(segment):
+                _compress_claimed(segment, log_file)
+            return True
+        finally:
+            # unlinked while still locked: a process waiting on the old inode finds the segment gone
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+
+
+def _compress_claimed(segment: str, log_file: str):
+    gz_path = segment + ".gz"
+    name = os.path.basename(gz_path)
+    # a crash after the index append only leaves the plain file to delete
+    if name in _indexed_segments(log_file):
+        os.remove(segment)
+        return
+    entries = []
+    fd, tmp = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=os.path.dirname(gz_path) or ".")
+    try:
+        with open(segment, "r", encoding="utf-8") as src, os.fdopen(fd, "wb") as out:
+            if fcntl is not None:
+                # waits out writers that opened the live log before the rotation (see observability)
+                fcntl.flock(src.fileno(), fcntl.LOCK_EX)
+            for chunk in _chunks(src, INDEX_CHUNK_EVENTS):
+                entry = _describe(chunk)
+                data = gzip.compress("".join(chunk).encode("utf-8"))
+                entry.update(segment=name, offset=out.tell(), length=len(data))
+                out.write(data)
+                entries.append(entry)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, gz_path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    # one write, so entries of segments compressed concurrently by other processes don't interleave
+    with open(index_path(log_file), "a", encoding="utf-8") as idx:
+        idx.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        idx.flush()
+        os.fsync(idx.fileno())
+    os.remove(segment)
+
+
+def _chunks(lines: Iterable[str], size: int) -> Iterator[List[str]]:
+    chunk = []
+    for line in lines:
+        if not line.endswith("\n"):
+            line += "\n"
+        chunk.append(line)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _describe(lines: List[str]) -> Dict:
+    start = end = None
+    names = set()
+    for line in lines:
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        t = event.get("time")
+        if isinstance(t, str):
+            start = t if start is None or t < start else start
+            end = t if end is None or t > end else end
+        names.add(event.get("name"))
+    return {"start": start, "end": end, "count": len(lines), "names": sorted(n for n in names if isinstance(n, str))}
+
+
+def read_index(log_file: str) -> List[Dict]:
+    entries = []
+    try:
+        with open(index_path(log_file), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def _as_time(value) -> Optional[str]:
+    if value is None:
+        return None
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def _parse_lines(lines: Iterable[str]) -> Iterator[Dict]:
+    for line in lines:
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(event, dict):
+            yield event
+
+
+def _read_member(path: str, offset: int, length: int) -> List[str]:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    return gzip.decompress(data).decode("utf-8").splitlines()
+
+
+def iter_raw(log_file: str, names=None, since=None, until=None) -> Iterator[Dict]:
+    """
+    Every stored event, oldest first: indexed gzip members (skipping members the
+    index rules out), then uncompressed rotated segments, then the live log.
+    Filters here are only used to skip whole members; callers still filter events.
+    """
+    names = set(names) if names else None
+    since, until = _as_time(since), _as_time(until)
+    base = os.path.dirname(log_file)
+    for entry in read_index(log_file):
+        if since is not None and entry.get("end") is not None and entry["end"] < since:
+            continue
+        if until is not None and entry.get("start") is not None and entry["start"] >= until:
+            continue
+        if names is not None and not names.intersection(entry.get("names") or ()):
+            continue
+        try:
+            lines = _read_member(os.path.join(base, entry["segment"]), entry["offset"], entry["length"])
+        except (OSError, EOFError) as e:
+            logger.warning("Skipping unreadable segment %s: %s", entry.get("segment"), e)
+            continue
+        yield from _parse_lines(lines)
+    for path in pending_segments(log_file) + [log_file]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                yield from _parse_lines(f)
+        except FileNotFoundError:
+            continue
+
+
+def iter_events(log_file: str, names=None, since=None, until=None, user: Optional[str] = None) -> Iterator[Dict]:
+    """Events named in `names` (any when None) with since <= time < until, optionally for one user."""
+    wanted = set(names) if names else None
+    lo, hi = _as_time(since), _as_time(until)
+    for event in iter_raw(log_file, wanted, lo, hi):
+        if wanted is not None and event.get("name") not in wanted:
+            continue
+        t = event.get("time") or ""
+        if (lo is not None and t < lo) or (hi is not None and t >= hi):
+            continue
+        if user is not None:
+            payload = event.get("payload")
+            if not isinstance(payload, dict) or payload.get("user", payload.get("user_id")) != user:
+                continue
+        yield event
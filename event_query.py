@@ -0,0 +1,298 @@
+"""
+Streaming queries over the event log (live events.log, rotated segments and
+gzip archives) in constant memory.
+
+    python event_query.py --name task_add_deduped --group-by hour
+    python event_query.py --name span --value payload.ms --group-by payload.labels.persona --since 7d
+    python event_query.py --delay task_added_pending_time task_scheduled --group-by user -p 50,95
+    python event_query.py --file old/events.log.20240101T000000.gz --group-by name --json
+
+Percentiles come from a log-bucketed histogram (about 1% relative error), so
+memory depends on the number of groups, not on the number of events.
+"""
+import argparse
+import gzip
+import json
+import math
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import event_log
+
+LOG_FILE = os.environ.get("OBS_LOG_FILE", "events.log")
+# open --delay pairs kept at most; the oldest unmatched starts are forgotten first
+MAX_PENDING_PAIRS = 100000
+
+_RELATIVE_RE = re.compile(r"^(\d+(?:\.\d+)?)([smhd])$")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+class LogHistogram:
+    """Quantile sketch: positive values land in log-scale buckets `relative_error` wide."""
+
+    __slots__ = ("gamma", "log_gamma", "buckets", "zeros", "count", "sum", "min", "max")
+
+    def __init__(self, relative_error: float = 0.01):
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value <= 0:
+            self.zeros += 1
+            return
+        i = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[i] = self.buckets.get(i, 0) + 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            # non-positive values share one bucket
+            return 0.0
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if rank < seen:
+                estimate = 2 * self.gamma ** i / (self.gamma + 1)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+
+class Group:
+    __slots__ = ("count", "first", "last", "hist")
+
+    def __init__(self, with_values: bool):
+        self.count = 0
+        self.first = None
+        self.last = None
+        self.hist = LogHistogram() if with_values else None
+
+    def add(self, t: str, value: Optional[float] = None):
+        self.count += 1
+        if t:
+            self.first = t if self.first is None or t < self.first else self.first
+            self.last = t if self.last is None or t > self.last else self.last
+        if self.hist is not None and value is not None:
+            self.hist.add(value)
+
+
+def parse_when(value: Optional[str]) -> Optional[str]:
+    """ISO timestamp, or a relative age like 15m / 24h / 7d, as an ISO string comparable with event times."""
+    if not value:
+        return None
+    m = _RELATIVE_RE.match(value.strip())
+    if m:
+        return (datetime.utcnow() - timedelta(seconds=float(m.group(1)) * _UNITS[m.group(2)])).isoformat()
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid time {value!r}: expected an ISO timestamp or an age like 30m, 24h, 7d")
+
+
+def field(event: Dict, path: str):
+    """name, time, trace_id, user, minute/hour/day buckets, payload.<a>.<b>, or a bare payload key."""
+    t = event.get("time") or ""
+    if path == "minute":
+        return t[:16]
+    if path == "hour":
+        return t[:13]
+    if path == "day":
+        return t[:10]
+    payload = event.get("payload") if isinstance(event.get("payload"), dict) else {}
+    if path == "user":
+        return payload.get("user", payload.get("user_id"))
+    if path in ("name", "time", "trace_id"):
+        return event.get(path)
+    parts = path.split(".")
+    if parts[0] == "payload":
+        parts = parts[1:]
+    node = payload
+    for part in parts:
+        if not isinstance(node, dict):
+            return None
+        node = node.get(part)
+    return node
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def iter_files(paths: Sequence[str]) -> Iterator[Dict]:
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        try:
+            with opener(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(event, dict):
+                        yield event
+        except (OSError, EOFError) as e:
+            print(f"warning: stopped reading {path}: {e}", file=sys.stderr)
+
+
+def select(events: Iterable[Dict], names=None, user=None, since=None, until=None) -> Iterator[Dict]:
+    wanted = set(names) if names else None
+    for event in events:
+        if wanted is not None and event.get("name") not in wanted:
+            continue
+        t = event.get("time") or ""
+        if (since and t < since) or (until and t >= until):
+            continue
+        if user is not None and field(event, "user") != user:
+            continue
+        yield event
+
+
+def delays(events: Iterable[Dict], start: str, end: str, key: str = "task_id") -> Iterator[Tuple[Dict, float]]:
+    """(start event, seconds until the matching end event) for each `key` seen in both, in end order."""
+    pending: Dict = {}
+    for event in events:
+        name = event.get("name")
+        k = field(event, key)
+        if k is None:
+            continue
+        if name == start:
+            if k not in pending:
+                if len(pending) >= MAX_PENDING_PAIRS:
+                    pending.pop(next(iter(pending)))
+                pending[k] = event
+        elif name == end and k in pending:
+            begin = pending.pop(k)
+            try:
+                dt = datetime.fromisoformat(event["time"]) - datetime.fromisoformat(begin["time"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            yield begin, dt.total_seconds()
+
+
+def aggregate(rows: Iterable[Tuple[Dict, Optional[float]]], group_by: Sequence[str], with_values: bool) -> Dict[Tuple, Group]:
+    groups: Dict[Tuple, Group] = {}
+    for event, value in rows:
+        key = tuple(field(event, g) for g in group_by)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = Group(with_values)
+        group.add(event.get("time") or "", value)
+    return groups
+
+
+def _window_hours(groups: Dict[Tuple, Group], since: Optional[str], until: Optional[str]) -> Optional[float]:
+    """Length of the query window: --since/--until, or the span of the whole stream where unset."""
+    first = since or min((g.first for g in groups.values() if g.first), default=None)
+    last = until or max((g.last for g in groups.values() if g.last), default=None)
+    if not first or not last:
+        return None
+    try:
+        hours = (datetime.fromisoformat(last) - datetime.fromisoformat(first)).total_seconds() / 3600
+    except ValueError:
+        return None
+    return hours if hours > 0 else None
+
+
+def summarize(groups: Dict[Tuple, Group], group_by: Sequence[str], percentiles: Sequence[float],
+              since: Optional[str], until: Optional[str]) -> List[Dict]:
+    # every group shares one window, so rates are comparable and a sparse group isn't divided by
+    # the few seconds between its own first and last event
+    hours = _window_hours(groups, since, until)
+    out = []
+    for key, group in sorted(groups.items(), key=lambda kv: -kv[1].count):
+        row = {g: v for g, v in zip(group_by, key)}
+        row["count"] = group.count
+        row["per_hour"] = round(group.count / hours, 3) if hours else None
+        if group.hist is not None and group.hist.count:
+            row["mean"] = round(group.hist.sum / group.hist.count, 3)
+            for p in percentiles:
+                row[f"p{p:g}"] = round(group.hist.quantile(p / 100), 3)
+            row["max"] = round(group.hist.max, 3)
+        out.append(row)
+    return out
+
+
+def _print_table(rows: List[Dict]):
+    if not rows:
+        print("(no matching events)")
+        return
+    cols = list(rows[0].keys())
+    for row in rows:
+        cols.extend(c for c in row if c not in cols)
+    cells = [[("" if row.get(c) is None else str(row.get(c))) for c in cols] for row in rows]
+    widths = [max(len(c), *(len(r[i]) for r in cells)) for i, c in enumerate(cols)]
+    print("  ".join(c.ljust(w) for c, w in zip(cols, widths)))
+    for r in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(r, widths)))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--log", default=LOG_FILE, help="live log; its rotated/indexed segments are read too")
+    ap.add_argument("--file", action="append", help="read these files (.gz ok) instead of --log")
+    ap.add_argument("--name", action="append", help="event name(s) to keep")
+    ap.add_argument("--user")
+    ap.add_argument("--since", type=parse_when, help="ISO time or relative age (30m, 24h, 7d)")
+    ap.add_argument("--until", type=parse_when, help="ISO time or relative age")
+    ap.add_argument("--group-by", default="name", help="comma-separated fields, e.g. name,hour or payload.persona")
+    ap.add_argument("--value", help="numeric field for mean/percentiles, e.g. payload.ms")
+    ap.add_argument("--delay", nargs=2, metavar=("START", "END"),
+                    help="seconds between START and END events sharing --key")
+    ap.add_argument("--key", default="task_id", help="field pairing --delay events")
+    ap.add_argument("-p", "--percentiles", default="50,95,99")
+    ap.add_argument("--json", action="store_true", help="one JSON object per group")
+    args = ap.parse_args(argv)
+
+    since, until = args.since, args.until
+    group_by = [g.strip() for g in args.group_by.split(",") if g.strip()]
+    percentiles = [float(p) for p in args.percentiles.split(",") if p.strip()]
+    names = list(args.name or [])
+    if args.delay:
+        names.extend(args.delay)
+
+    if args.file:
+        source = select(iter_files(args.file), names, args.user, since, until)
+    else:
+        source = event_log.iter_events(args.log, names or None, since, until, user=args.user)
+
+    if args.delay:
+        rows = delays(source, args.delay[0], args.delay[1], args.key)
+        with_values = True
+    elif args.value:
+        rows = ((e, _number(field(e, args.value))) for e in source)
+        with_values = True
+    else:
+        rows = ((e, None) for e in source)
+        with_values = False
+
+    result = summarize(aggregate(rows, group_by, with_values), group_by, percentiles, since, until)
+    if args.json:
+        for row in result:
+            print(json.dumps(row))
+    else:
+        _print_table(result)
+
+
+if __name__ == "__main__":
+    main()
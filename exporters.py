@@ -0,0 +1,144 @@
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger("exporters")
+
+EXPORT_TIMEOUT_SECONDS = float(os.environ.get("OBS_EXPORT_TIMEOUT_SECONDS", "2"))
+# events per POST; larger worker batches are split
+EXPORT_BATCH_SIZE = int(os.environ.get("OBS_EXPORT_BATCH_SIZE", "200"))
+EXPORT_RETRIES = int(os.environ.get("OBS_EXPORT_RETRIES", "3"))
+EXPORT_BACKOFF_MS = int(os.environ.get("OBS_EXPORT_BACKOFF_MS", "100"))
+EXPORT_BACKOFF_MAX_MS = int(os.environ.get("OBS_EXPORT_BACKOFF_MAX_MS", "2000"))
+# consecutive failed batches before the breaker opens, and how long it stays open
+BREAKER_THRESHOLD = int(os.environ.get("OBS_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN_SECONDS = float(os.environ.get("OBS_BREAKER_COOLDOWN_SECONDS", "30"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `threshold` consecutive failures; open rejects calls
+    until `cooldown` has passed, then lets one trial call through (half-open).
+    A success closes it again, a failed trial re-opens it.
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN_SECONDS):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record(self, ok: bool):
+        with self._lock:
+            self._trial = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class HttpExporter:
+    """
+    Posts pre-serialized events as JSON arrays over one pooled keep-alive
+    session. Retries transient failures with exponential backoff and full
+    jitter; a circuit breaker skips a dead collector instead of retrying it
+    for every batch.
+    """
+
+    def __init__(self, name: str, url: str, headers: Dict[str, str], batch_size: int = EXPORT_BATCH_SIZE,
+                 retries: int = EXPORT_RETRIES, timeout: float = EXPORT_TIMEOUT_SECONDS,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.url = url
+        self.batch_size = max(1, batch_size)
+        self.retries = max(0, retries)
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        self.session.headers.setdefault("Content-Type", "application/json")
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.stats = {"sent": 0, "failed": 0, "retries": 0, "short_circuited": 0}
+
+    def send(self, lines: List[str]) -> int:
+        """Export serialized events; returns how many were accepted by the collector."""
+        sent = 0
+        for i in range(0, len(lines), self.batch_size):
+            chunk = lines[i:i + self.batch_size]
+            if not self.breaker.allow():
+                self.stats["short_circuited"] += len(chunk)
+                continue
+            ok = self._post(("[" + ",".join(chunk) + "]").encode("utf-8"))
+            self.breaker.record(ok)
+            if ok:
+                sent += len(chunk)
+                self.stats["sent"] += len(chunk)
+            else:
+                self.stats["failed"] += len(chunk)
+        return sent
+
+    def _post(self, body: bytes) -> bool:
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats["retries"] += 1
+                cap = min(EXPORT_BACKOFF_MAX_MS, EXPORT_BACKOFF_MS * (2 ** (attempt - 1)))
+                time.sleep(random.uniform(0, cap) / 1000.0)
+            try:
+                resp = self.session.post(self.url, data=body, timeout=self.timeout)
+            except requests.RequestException as e:
+                logger.debug("%s export failed: %s", self.name, e)
+                continue
+            if resp.status_code < 400:
+                return True
+            logger.debug("%s export rejected: HTTP %s", self.name, resp.status_code)
+            if resp.status_code not in RETRY_STATUSES:
+                return False
+        return False
+
+    def snapshot(self) -> Dict:
+        return dict(self.stats, state=self.breaker.state)
+
+    def close(self):
+        self.session.close()
+
+
+def build_exporters() -> List[HttpExporter]:
+    """Exporters configured through LANGFUSE_* / ARIZE_* env vars."""
+    out = []
+    langfuse_key, langfuse_url = os.environ.get("LANGFUSE_API_KEY"), os.environ.get("LANGFUSE_API_URL")
+    if langfuse_key and langfuse_url:
+        out.append(HttpExporter("langfuse", f"{langfuse_url}/events", {"x-api-key": langfuse_key}))
+    arize_key, arize_url = os.environ.get("ARIZE_API_KEY"), os.environ.get("ARIZE_API_URL")
+    if arize_key and arize_url:
+        out.append(HttpExporter("arize", arize_url.rstrip("/") + "/events", {"Authorization": f"Bearer {arize_key}"}))
+    return out
@@ -0,0 +1,147 @@
+"""
+Local stand-in for the Langfuse/Arize event collectors, for trying out and
+benchmarking the exporters without network access.
+
+    python fake_collector.py --port 8799 --latency-ms 20 --fail-rate 0.1
+    python fake_collector.py --bench 20000 --baseline
+
+Point LANGFUSE_API_URL (or ARIZE_API_URL) at http://127.0.0.1:<port> to use it
+with the app; GET /stats returns what it has received so far.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeCollector:
+    def __init__(self, port: int = 0, latency_ms: float = 0.0, fail_rate: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.fail_rate = fail_rate
+        self.stats = {"requests": 0, "events": 0, "rejected": 0, "connections": 0}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def _handler(self):
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, so pooled clients reuse connections
+            wbufsize = 64 * 1024  # one write per response; avoids Nagle/delayed-ACK stalls on keep-alive
+
+            def setup(self):
+                super().setup()
+                with collector._lock:
+                    collector.stats["connections"] += 1
+
+            def _reply(self, status: int, body: dict):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                with collector._lock:
+                    self._reply(200, dict(collector.stats))
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if collector.latency:
+                    time.sleep(collector.latency)
+                with collector._lock:
+                    collector.stats["requests"] += 1
+                    if random.random() < collector.fail_rate:
+                        collector.stats["rejected"] += 1
+                        rejected = True
+                    else:
+                        rejected = False
+                if rejected:
+                    self._reply(503, {"error": "injected failure"})
+                    return
+                try:
+                    events = json.loads(body)
+                except json.JSONDecodeError:
+                    self._reply(400, {"error": "invalid json"})
+                    return
+                n = len(events) if isinstance(events, list) else 1
+                with collector._lock:
+                    collector.stats["events"] += n
+                self._reply(200, {"accepted": n})
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeCollector":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _bench(args):
+    import requests
+    from exporters import HttpExporter
+
+    collector = FakeCollector(latency_ms=args.latency_ms, fail_rate=args.fail_rate).start()
+    lines = [json.dumps({"time": "2024-01-01T00:00:00", "name": "bench_event", "payload": {"i": i}})
+             for i in range(args.bench)]
+
+    exporter = HttpExporter("bench", f"{collector.url}/events", {})
+    started = time.perf_counter()
+    for i in range(0, len(lines), args.batch):
+        exporter.send(lines[i:i + args.batch])
+    elapsed = time.perf_counter() - started
+    print(f"pooled+batched: {len(lines)} events in {elapsed:.2f}s ({len(lines) / elapsed:.0f} events/s) {exporter.snapshot()}")
+
+    if args.baseline:
+        n = min(len(lines), 2000)
+        started = time.perf_counter()
+        for line in lines[:n]:
+            try:
+                requests.post(f"{collector.url}/events", data=line, timeout=2)
+            except requests.RequestException:
+                pass
+        elapsed = time.perf_counter() - started
+        print(f"one post per event, no session: {n} events in {elapsed:.2f}s ({n / elapsed:.0f} events/s)")
+    print(f"collector: {collector.stats}")
+    collector.stop()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--port", type=int, default=8799)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    ap.add_argument("--bench", type=int, default=0, help="export N events against an in-process collector and exit")
+    ap.add_argument("--batch", type=int, default=500)
+    ap.add_argument("--baseline", action="store_true", help="also time the old one-request-per-event path")
+    args = ap.parse_args()
+
+    if args.bench:
+        _bench(args)
+        return
+    collector = FakeCollector(args.port, args.latency_ms, args.fail_rate)
+    print(f"fake collector listening on {collector.url}")
+    try:
+        collector.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
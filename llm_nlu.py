@@ -2,9 +2,16 @@
 import os
 import json
 import logging
+import threading
+import time
+import concurrent.futures
 from datetime import datetime
+from typing import Dict, Optional
 from dateutil import parser as dateparser
 
+import metrics
+import parse_cache
+
 logger = logging.getLogger("llm_nlu")
 logger.setLevel(logging.INFO)
 
@@ -25,6 +32,20 @@ else:
         logger.info("OPENAI_API_KEY not set; will use heuristic fallback.")
     OPENAI_AVAILABLE = False
 
+# hedged mode: answer from the heuristic parser when it is confident, or when the model
+# misses its deadline, instead of waiting on the model for every message
+HEDGE = os.environ.get("NLU_HEDGE", "false").lower() in ("1", "true", "yes")
+HEDGE_DEADLINE_MS = int(os.environ.get("NLU_HEDGE_DEADLINE_MS", "400"))
+HEDGE_CONFIDENCE = float(os.environ.get("NLU_HEDGE_CONFIDENCE", "0.8"))
+HEDGE_WORKERS = int(os.environ.get("NLU_HEDGE_WORKERS", "8"))
+# upper bound on any model call, so ignored calls can't hold a worker forever
+MODEL_TIMEOUT_S = float(os.environ.get("NLU_MODEL_TIMEOUT_S", "20"))
+_pool = None
+_pool_lock = threading.Lock()
+
+PARSE_CACHE_ENABLED = os.environ.get("PARSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+cache = parse_cache.ParseCache()
+
 def heuristic_parse_goal(text: str, ref: datetime = None):
     try:
         from nlu import parse_goal as hparse
@@ -42,36 +63,166 @@ def heuristic_parse_goal(text: str, ref: datetime = None):
 SYSTEM_PROMPT = "You are a JSON-outputting parser. Return a compact JSON object with keys intent, title (optional), duration_minutes (optional), date (optional iso), estimated_minutes (optional), priority (optional), raw."
 
 def parse_goal(text: str, ref: datetime = None):
-   
+    return parse_goal_with_source(text, ref)[0]
+
+
+def parse_goal_with_source(text: str, ref: datetime = None):
+    """
+    (parsed, source, origin). source is how this call got its answer: "cache", "model",
+    "heuristic", "fallback" (model call failed) or "deadline" (hedged mode: the model missed
+    its deadline). origin is which parser produced the answer, "model" or "heuristic",
+    and is kept with cached entries so a hit reports what the original parse did.
+    """
     ref = ref or datetime.utcnow()
+    if not PARSE_CACHE_ENABLED:
+        parsed, source = _parse_goal(text, ref)
+        return parsed, source, _origin(source)
+    # model results and heuristic results live in separate namespaces
+    key = cache.key(_cache_namespace(), text, ref)
+    entry = cache.get(key)
+    if isinstance(entry, dict) and isinstance(entry.get("parsed"), dict):
+        parsed = entry["parsed"]
+        parsed["raw"] = text
+        return parsed, "cache", entry.get("origin") or "heuristic"
+    parsed, source = _parse_goal(text, ref, key)
+    if source not in ("fallback", "deadline"):
+        _cache_put(key, parsed, ref, _origin(source))
+    return parsed, source, _origin(source)
+
+
+def _origin(source: str) -> str:
+    return "model" if source == "model" else "heuristic"
+
+
+def _cache_namespace() -> str:
     if not OPENAI_AVAILABLE:
-        return heuristic_parse_goal(text, ref)
+        return "heuristic"
+    return OPENAI_MODEL + ("+hedged" if HEDGE else "")
+
+
+def _cache_put(key: str, parsed: Dict, ref: datetime, origin: str):
+    # an entry is useless once its reference-time bucket is over
+    cache.put(key, {"origin": origin, "parsed": parsed}, ttl=min(cache.ttl, parse_cache.seconds_left_in_bucket(ref)))
+
+
+def _parse_goal(text: str, ref: datetime, key: Optional[str] = None):
+    # heuristic fallbacks after a failed model call are reported as "fallback" and not cached
+    if not OPENAI_AVAILABLE:
+        return heuristic_parse_goal(text, ref), "heuristic"
+    if HEDGE:
+        return _hedged_parse(text, ref, key)
 
     try:
-        completion = openai.ChatCompletion.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": text}
-            ],
-            temperature=0.0,
-            max_tokens=300
-        )
-        content = completion["choices"][0]["message"]["content"]
-    
-        start = content.find("{")
-        if start == -1:
-            return heuristic_parse_goal(text, ref)
-        json_text = content[start:]
-        parsed = json.loads(json_text)
-        if parsed.get("date"):
-            try:
-                dt = dateparser.parse(parsed["date"], default=datetime.utcnow())
-                parsed["date"] = dt.isoformat()
-            except Exception:
-                pass
-        parsed["raw"] = parsed.get("raw", text)
-        return parsed
+        parsed = _model_parse(text)
+        if parsed is None:
+            return heuristic_parse_goal(text, ref), "fallback"
+        return parsed, "model"
     except Exception as e:
         logger.exception("LLM parse failed, falling back to heuristic: %s", e)
-        return heuristic_parse_goal(text, ref)
\ No newline at end of file
+        return heuristic_parse_goal(text, ref), "fallback"
+
+
+def _model_parse(text: str) -> Optional[Dict]:
+    """One model round trip; None when the reply holds no JSON object."""
+    completion = openai.ChatCompletion.create(
+        model=OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": text}
+        ],
+        temperature=0.0,
+        max_tokens=300,
+        request_timeout=MODEL_TIMEOUT_S
+    )
+    content = completion["choices"][0]["message"]["content"]
+
+    start = content.find("{")
+    if start == -1:
+        return None
+    json_text = content[start:]
+    parsed = json.loads(json_text)
+    if parsed.get("date"):
+        try:
+            dt = dateparser.parse(parsed["date"], default=datetime.utcnow())
+            parsed["date"] = dt.isoformat()
+        except Exception:
+            pass
+    parsed["raw"] = parsed.get("raw", text)
+    return parsed
+
+
+def _heuristic_scored(text: str, ref: datetime):
+    try:
+        from nlu import parse_goal_scored
+        return parse_goal_scored(text, ref)
+    except Exception:
+        return heuristic_parse_goal(text, ref), 0.0
+
+
+def _timed_model_parse(text: str):
+    started = time.perf_counter()
+    try:
+        return _model_parse(text)
+    finally:
+        metrics.observe("nlu_model_seconds", time.perf_counter() - started)
+
+
+def _compare(heuristic: Dict, model: Optional[Dict], late: bool):
+    if model is None:
+        return
+    agree = (heuristic.get("intent") or "unknown") == (model.get("intent") or "unknown")
+    metrics.inc("nlu_hedge_compared_total", agree=str(agree).lower(), late=str(late).lower())
+
+
+def _hedged_parse(text: str, ref: datetime, key: Optional[str]):
+    """
+    Heuristic first; when it is confident enough the model is never asked. Otherwise the
+    model gets HEDGE_DEADLINE_MS and the heuristic answer is used if it misses. A late
+    model answer is still compared with the heuristic and cached for the next request.
+    """
+    heuristic, confidence = _heuristic_scored(text, ref)
+    if confidence >= HEDGE_CONFIDENCE:
+        metrics.inc("nlu_hedge_total", winner="heuristic", reason="confident")
+        return heuristic, "heuristic"
+
+    future = _executor().submit(_timed_model_parse, text)
+    try:
+        parsed = future.result(timeout=HEDGE_DEADLINE_MS / 1000.0)
+    except concurrent.futures.TimeoutError:
+        if not future.cancel():
+            # already running: ignore it, but keep its answer for the metrics and the cache
+            def _late(f):
+                try:
+                    late = f.result()
+                except Exception:
+                    return
+                _compare(heuristic, late, late=True)
+                if late is not None and key is not None and PARSE_CACHE_ENABLED:
+                    _cache_put(key, late, ref, "model")
+            future.add_done_callback(_late)
+        metrics.inc("nlu_hedge_total", winner="heuristic", reason="deadline")
+        return heuristic, "deadline"
+    except Exception as e:
+        logger.warning("LLM parse failed in hedged mode, using heuristic: %s", e)
+        metrics.inc("nlu_hedge_total", winner="heuristic", reason="model_error")
+        return heuristic, "fallback"
+    _compare(heuristic, parsed, late=False)
+    if parsed is None:
+        metrics.inc("nlu_hedge_total", winner="heuristic", reason="model_error")
+        return heuristic, "fallback"
+    metrics.inc("nlu_hedge_total", winner="model", reason="in_time")
+    return parsed, "model"
+
+
+def _executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = concurrent.futures.ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="llm-nlu")
+    return _pool
+
+
+metrics.describe("nlu_hedge_total", "Hedged parses by winning path (heuristic/model) and reason.")
+metrics.describe("nlu_hedge_compared_total", "Heuristic vs model intent comparisons in hedged mode; late=true once the deadline had passed.")
+metrics.describe("nlu_model_seconds", "Latency of model parse calls made in hedged mode.")
@@ -20,13 +20,17 @@ CORE_FUNCTIONS: List[Dict] = [
     },
     {
         "name": "list_tasks",
-        "description": "List tasks for the user (optionally filtered by status).",
+        "description": "List tasks for the user, oldest first, optionally filtered by status or start-time window. Pass next_cursor back as cursor to get the following page.",
         "parameters": {
             "type": "object",
             "properties": {
                 "user_id": {"type": "string"},
                 "status": {"type": ["string","null"]},
-                "limit": {"type": "integer"}
+                "limit": {"type": "integer"},
+                "cursor": {"type": ["string","null"]},
+                "fields": {"type": "array", "items": {"type": "string"}},
+                "start_from": {"type": ["string","null"]},
+                "start_to": {"type": ["string","null"]}
             },
             "required": ["user_id"]
         }
@@ -0,0 +1,279 @@
+"""
+In-process latency histograms, counters and request-scoped trace ids,
+rendered in the Prometheus text format by GET /metrics.
+
+    with metrics.span("parse_goal"):
+        parsed = llm_nlu.parse_goal(text)
+    metrics.tag(intent=parsed["intent"])   # labels the enclosing span
+
+Every span feeds the `planner_span_seconds` histogram labelled with its name
+(and any labels given to span()/tag()); failing spans also count in
+`planner_span_errors_total`.
+"""
+import contextvars
+import functools
+import inspect
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = "planner_"
+# also emit a "span" event per finished span (trace id, name, duration); off by default to keep events.log small
+SPAN_EVENTS = os.environ.get("METRICS_SPAN_EVENTS", "false").lower() in ("1", "true", "yes")
+
+_TRACE_ID_RE = re.compile(r"^[0-9a-fA-F-]{8,64}$")
+
+_lock = threading.Lock()
+_histograms: Dict[Tuple[str, Tuple], "Histogram"] = {}
+_counters: Dict[Tuple[str, Tuple], float] = {}
+_gauges: Dict[Tuple[str, Tuple], float] = {}
+_help: Dict[str, str] = {}
+
+_trace_id: contextvars.ContextVar = contextvars.ContextVar("metrics_trace_id", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("metrics_span", default=None)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+def _key(labels: Dict) -> Tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def describe(name: str, text: str):
+    _help[name] = text
+
+
+def observe(name: str, seconds: float, **labels):
+    key = (name, _key(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram()
+        hist.observe(seconds)
+
+
+def inc(name: str, amount: float = 1, **labels):
+    key = (name, _key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges[(name, _key(labels))] = value
+
+
+def trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+@contextmanager
+def trace(trace_id: Optional[str] = None):
+    """Run the block under a trace id (a new one unless a valid id is passed)."""
+    if not trace_id or not _TRACE_ID_RE.match(trace_id):
+        trace_id = uuid.uuid4().hex
+    token = _trace_id.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _trace_id.reset(token)
+
+
+class Span:
+    __slots__ = ("name", "labels", "started", "duration")
+
+    def __init__(self, name: str, labels: Dict):
+        self.name = name
+        self.labels = labels
+        self.started = time.perf_counter()
+        self.duration = None
+
+
+@contextmanager
+def span(name: str, **labels):
+    sp = Span(name, labels)
+    token = _current_span.set(sp)
+    error = False
+    try:
+        yield sp
+    except BaseException:
+        error = True
+        raise
+    finally:
+        _current_span.reset(token)
+        sp.duration = time.perf_counter() - sp.started
+        observe("span_seconds", sp.duration, span=name, **sp.labels)
+        if error:
+            inc("span_errors_total", span=name, **sp.labels)
+        if SPAN_EVENTS:
+            _emit_span(sp)
+
+
+def _emit_span(sp: Span):
+    try:
+        from observability import emit_event
+        emit_event("span", {"span": sp.name, "ms": round(sp.duration * 1000, 3), "labels": sp.labels})
+    except Exception:
+        pass
+
+
+def tag(**labels):
+    """Add labels to the innermost open span (e.g. the intent, once it is known)."""
+    sp = _current_span.get()
+    if sp is not None:
+        sp.labels.update(labels)
+
+
+def traced(name: str, **labels):
+    """Decorator form of span(); works for sync and async functions."""
+    def deco(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, **labels):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def instrument_tool(tool: str, fn: Callable, persona: str) -> Callable:
+    """Time a tool function and count its calls by outcome."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        outcome = "error"
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            observe("tool_seconds", time.perf_counter() - started, tool=tool, persona=persona)
+            inc("tool_calls_total", tool=tool, persona=persona, outcome=outcome)
+    return wrapper
+
+
+class TraceMiddleware:
+    """
+    ASGI middleware: runs each HTTP request under a trace id (taken from an
+    incoming X-Trace-Id header when valid), echoes it back as X-Trace-Id and
+    records request latency per endpoint.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = None
+        for name, value in scope.get("headers") or ():
+            if name == b"x-trace-id":
+                incoming = value.decode("latin-1")
+                break
+        status = {"code": 500}
+
+        with trace(incoming) as tid:
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    status["code"] = message["status"]
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"x-trace-id", tid.encode("latin-1"))]
+                await send(message)
+
+            started = time.perf_counter()
+            try:
+                await self.app(scope, receive, send_with_trace)
+            finally:
+                # label by endpoint function, not raw path, so ids in URLs don't explode cardinality
+                endpoint = scope.get("endpoint")
+                handler = getattr(endpoint, "__name__", "unmatched")
+                observe("http_request_seconds", time.perf_counter() - started,
+                        handler=handler, method=scope.get("method"))
+                inc("http_requests_total", handler=handler, method=scope.get("method"), status=status["code"])
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: Tuple, extra: Tuple = ()) -> str:
+    items = list(pairs) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _fmt(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    lines: List[str] = []
+    with _lock:
+        hists = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+        hists = [(k, (list(h.counts), h.sum, h.count)) for k, h in hists]
+
+    def header(name: str, kind: str):
+        full = PREFIX + name
+        if name in _help:
+            lines.append(f"# HELP {full} {_help[name]}")
+        lines.append(f"# TYPE {full} {kind}")
+
+    last = None
+    for (name, labels), (counts, total, count) in hists:
+        if name != last:
+            header(name, "histogram")
+            last = name
+        cumulative = 0
+        for bound, n in zip(BUCKETS, counts):
+            cumulative += n
+            lines.append(f"{PREFIX}{name}_bucket{_labels(labels, (('le', repr(bound)),))} {cumulative}")
+        lines.append(f"{PREFIX}{name}_bucket{_labels(labels, (('le', '+Inf'),))} {count}")
+        lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {repr(total)}")
+        lines.append(f"{PREFIX}{name}_count{_labels(labels)} {count}")
+    for kind, series in (("counter", counters), ("gauge", gauges)):
+        last = None
+        for (name, labels), value in series:
+            if name != last:
+                header(name, kind)
+                last = name
+            lines.append(f"{PREFIX}{name}{_labels(labels)} {_fmt(value)}")
+    return "\n".join(lines) + "\n"
+
+
+describe("span_seconds", "Latency of instrumented stages (spans).")
+describe("span_errors_total", "Spans that ended with an exception.")
+describe("tool_seconds", "Latency of agent tool calls by tool and persona.")
+describe("tool_calls_total", "Agent tool calls by tool, persona and outcome.")
+describe("http_request_seconds", "HTTP request latency by handler.")
+describe("http_requests_total", "HTTP requests by handler, method and status.")
@@ -13,49 +13,123 @@ def _as_iso(dt):
             return dt
     return dt.isoformat()
 
+# Intent keywords in the order parse_goal checks them. Matching is plain substring
+# matching on the lowercased text, exactly like the original `kw in t` checks.
+_INTENT_KEYWORDS = (
+    ("mark_done", ("done", "complete", "mark done", "finished")),
+    ("list_tasks", ("list tasks", "show tasks", "what are my tasks", "my tasks")),
+    ("self_reflection", ("reflect", "self-reflection", "how did i do", "review")),
+    ("summarize_tasks", ("summarize", "summary", "summarise")),
+    ("estimate_effort", ("estimate", "effort", "how long")),
+    ("prioritize_tasks", ("prioritize", "prioritise", "prioritiz")),
+    ("suggest", ("suggest",)),
+    ("schedule", ("schedule",)),
+    ("schedule_task", ("schedule", "schedule a", "meeting", "appointment", "tomorrow", "today", "at ", "pm", "am", "on ")),
+    ("add_words", ("add", "create", "todo", "remind", "schedule")),
+    ("time_words", ("tomorrow", "today", "at", "pm", "am", "on")),
+)
+_FLAG = {name: 1 << i for i, (name, _) in enumerate(_INTENT_KEYWORDS)}
+
+
+def _compile_keywords():
+    flags = {}
+    for name, words in _INTENT_KEYWORDS:
+        for w in words:
+            flags[w] = flags.get(w, 0) | _FLAG[name]
+    # The lookahead reports one keyword per position: the longest, since the trie
+    # tries longer continuations first. Crediting each match with every keyword that
+    # is a prefix of it ("at " also means "at") recovers all keywords starting there;
+    # keywords that aren't prefixes of each other can't start at the same spot.
+    closure = {w: 0 for w in flags}
+    for w in flags:
+        for p in flags:
+            if w.startswith(p):
+                closure[w] |= flags[p]
+    trie: dict = {}
+    for w in flags:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = True
+    pattern = re.compile("(?=(" + _trie_regex(trie) + "))")
+    return pattern, closure
+
+
+def _trie_regex(node: dict) -> str:
+    branches = [re.escape(ch) + _trie_regex(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        # greedy optional: a longer keyword wins, falling back to the one ending here
+        return "(?:" + body + ")?"
+    return body
+
+
+_KEYWORD_RE, _KEYWORD_FLAGS = _compile_keywords()
+# intents decided by keywords alone; they come first in _INTENT_KEYWORDS, so the lowest set bit wins
+_SIMPLE = tuple(name for name, _ in _INTENT_KEYWORDS[:6])
+_SIMPLE_MASK = (1 << len(_SIMPLE)) - 1
+_ID_RE = re.compile(r"[0-9a-fA-F\-]{8,36}")
+_DURATION_RE = re.compile(r"(\d+)\s*(h|hr|hour|m|min)")
+_TITLE_STOPWORDS_RE = re.compile(r"\b(schedule|set|a|for|tomorrow|today|at|on|in|meeting|appointment)\b", re.I)
+_ADD_PREFIX_RE = re.compile(r"^(add|create|todo|remind me to)\s*", re.I)
+
+# how far each outcome of parse_goal can be trusted; intents picked by specific keywords score
+# high, while schedule_task ("at", "on", "am" anywhere) and the add_task catch-all score low
+CONFIDENCE = {
+    "mark_done": 0.95, "mark_done_without_id": 0.6, "list_tasks": 0.9, "self_reflection": 0.8,
+    "summarize_tasks": 0.9, "estimate_effort": 0.85, "prioritize_tasks": 0.9, "suggest_schedule": 0.85,
+    "schedule_task": 0.5, "add_task": 0.75, "no_keyword": 0.3,
+}
+
+
+def _keyword_flags(t: str) -> int:
+    mask = 0
+    for word in _KEYWORD_RE.findall(t):
+        mask |= _KEYWORD_FLAGS[word]
+    return mask
+
+
 def parse_goal(text: str, ref: datetime = None):
+    return parse_goal_scored(text, ref)[0]
+
+
+def parse_goal_scored(text: str, ref: datetime = None):
+    """(parsed, confidence): how much the keyword match that picked the intent can be trusted."""
     ref = ref or datetime.utcnow()
     t = (text or "").strip().lower()
     out = {"intent": "unknown", "raw": text}
+    # the top-priority intent needs no sweep: it wins whatever else the text contains
+    found = _FLAG["mark_done"] if ("done" in t or "complete" in t or "finished" in t) else _keyword_flags(t)
 
-    if any(kw in t for kw in ("done", "complete", "mark done", "finished")):
-        out["intent"] = "mark_done"
-        m = re.search(r"[0-9a-fA-F\-]{8,36}", text)
-        if m:
-            out["task_id"] = m.group(0)
-        return out
-
-    if any(kw in t for kw in ("list tasks", "show tasks", "what are my tasks", "my tasks")):
-        out["intent"] = "list_tasks"
-        return out
-
-    if any(kw in t for kw in ("reflect", "self-reflection", "how did i do", "review")):
-        out["intent"] = "self_reflection"
-        return out
-
-    if any(kw in t for kw in ("summarize", "summary", "summarise")):
-        out["intent"] = "summarize_tasks"
-        return out
-    if any(kw in t for kw in ("estimate", "effort", "how long")):
-        out["intent"] = "estimate_effort"
-        ids = re.findall(r"[0-9a-fA-F\-]{8,36}", text)
-        if ids:
-            out["task_ids"] = ids
-        return out
-    if any(kw in t for kw in ("prioritize", "prioritise", "prioritiz")):
-        out["intent"] = "prioritize_tasks"
-        return out
-    if "suggest" in t and "schedule" in t:
+    simple = found & _SIMPLE_MASK
+    if simple:
+        intent = _SIMPLE[(simple & -simple).bit_length() - 1]
+        out["intent"] = intent
+        if intent == "mark_done":
+            m = _ID_RE.search(text)
+            if m:
+                out["task_id"] = m.group(0)
+        elif intent == "estimate_effort":
+            ids = _ID_RE.findall(text)
+            if ids:
+                out["task_ids"] = ids
+        if intent == "mark_done" and "task_id" not in out:
+            return out, CONFIDENCE["mark_done_without_id"]
+        return out, CONFIDENCE[intent]
+
+    if found & _FLAG["suggest"] and found & _FLAG["schedule"]:
         out["intent"] = "suggest_schedule"
-        m = re.search(r"(\d+)\s*(h|hr|hour|m|min)", text)
+        m = _DURATION_RE.search(text)
         if m:
             val = int(m.group(1))
             out["duration_minutes"] = val * 60 if m.group(2).startswith("h") else val
-        return out
+        return out, CONFIDENCE["suggest_schedule"]
 
-    if any(kw in t for kw in ("schedule", "schedule a", "meeting", "appointment", "tomorrow", "today", "at ", "pm", "am", "on ")):
+    if found & _FLAG["schedule_task"]:
         out["intent"] = "schedule_task"
-        title = re.sub(r"\b(schedule|set|a|for|tomorrow|today|at|on|in|meeting|appointment)\b", "", t, flags=re.I).strip()
+        title = _TITLE_STOPWORDS_RE.sub("", t).strip()
         out["title"] = title or None
         try:
             dt = dateparser.parse(text, default=ref)
@@ -63,7 +137,7 @@ def parse_goal(text: str, ref: datetime = None):
                 out["date"] = dt.isoformat()
         except Exception:
             pass
-        m = re.search(r"(\d+)\s*(h|hr|hour|m|min)", text)
+        m = _DURATION_RE.search(text)
         if m:
             val = int(m.group(1))
             if m.group(2).startswith("h"):
@@ -73,18 +147,18 @@ def parse_goal(text: str, ref: datetime = None):
         else:
             out["duration_minutes"] = 60
         out["estimated_minutes"] = out.get("duration_minutes", 60)
-        return out
+        return out, CONFIDENCE["schedule_task"]
 
-    if any(kw in t for kw in ("add", "create", "todo", "remind", "schedule")) and not any(kw in t for kw in ("tomorrow","today","at","pm","am","on")):
+    if found & _FLAG["add_words"] and not found & _FLAG["time_words"]:
         out["intent"] = "add_task"
-        m = re.sub(r"^(add|create|todo|remind me to)\s*", "", text, flags=re.I).strip()
+        m = _ADD_PREFIX_RE.sub("", text).strip()
         out["title"] = m or text
         out["estimated_minutes"] = 60
         out["priority"] = 3
-        return out
+        return out, CONFIDENCE["add_task"]
 
     out["intent"] = "add_task"
     out["title"] = text
     out["estimated_minutes"] = 60
     out["priority"] = 3
-    return out
\ No newline at end of file
+    return out, CONFIDENCE["no_keyword"]
\ No newline at end of file
@@ -1,50 +1,380 @@
-
+import atexit
+import contextvars
 import json
 import os
+import queue
+import random
 import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 import logging
-import requests
+try:
+    import fcntl
+except ImportError:  # Windows: a single worker process writes the log
+    fcntl = None
+import event_log
+import exporters
+import metrics
 
 logger = logging.getLogger("observability")
 
 LOG_FILE = os.environ.get("OBS_LOG_FILE", "events.log")
 LOCK = threading.Lock()
 
-LANGFUSE_API_KEY = os.environ.get("LANGFUSE_API_KEY")
-LANGFUSE_API_URL = os.environ.get("LANGFUSE_API_URL")  # e.g. https://api.langfuse.com
+# Langfuse/Arize exporters are configured by LANGFUSE_API_KEY/_URL and ARIZE_API_KEY/_URL (see exporters.py)
+
+# events are queued and written/exported by a background worker; "false" writes inline
+ASYNC = os.environ.get("OBS_ASYNC", "true").lower() in ("1", "true", "yes")
+QUEUE_SIZE = int(os.environ.get("OBS_QUEUE_SIZE", "10000"))
+# what emit_event does when the queue is full: drop_new, drop_oldest or block (up to OBS_BLOCK_TIMEOUT_MS)
+QUEUE_POLICY = os.environ.get("OBS_QUEUE_POLICY", "drop_new")
+BLOCK_TIMEOUT_MS = int(os.environ.get("OBS_BLOCK_TIMEOUT_MS", "1000"))
+BATCH_SIZE = int(os.environ.get("OBS_BATCH_SIZE", "500"))
+FLUSH_INTERVAL_MS = int(os.environ.get("OBS_FLUSH_INTERVAL_MS", "200"))
+# rotate the live log once it reaches this size / age; rotated segments are gzipped and indexed (see event_log.py)
+ROTATE_BYTES = int(os.environ.get("OBS_ROTATE_BYTES", str(64 * 1024 * 1024)))
+ROTATE_SECONDS = int(os.environ.get("OBS_ROTATE_SECONDS", "0"))
+
+# Per-event payload policies, keyed by event name or a "prefix:*" pattern:
+#   slim:     fields holding a dict that are reduced to "<field>_id" (the dict's "id")
+#   redact:   fields replaced by "[redacted]"
+#   truncate: {field: max_chars} for long strings such as tracebacks
+#   sample:   fraction of events kept (0..1)
+#   dedup_on: fields identifying an event; repeats within one request are dropped
+# OBS_EVENT_POLICIES (JSON, same shape) overrides entries by name.
+EVENT_POLICIES = {
+    "task_added": {"slim": ["task"]},
+    "task_completed": {"slim": ["task"]},
+    "task_updated": {"slim": ["task"]},
+    "task_scheduled": {"slim": ["task"], "dedup_on": ["task_id", "start", "end"]},
+    "task_added_pending_time": {"slim": ["task"]},
+    "tool_call:add_task": {"slim": ["task"]},
+    "scheduling_error": {"truncate": {"trace": 2000}},
+    "error": {"truncate": {"trace": 4000}},
+}
+try:
+    EVENT_POLICIES.update(json.loads(os.environ.get("OBS_EVENT_POLICIES") or "{}"))
+except (ValueError, TypeError):
+    logger.warning("Ignoring invalid OBS_EVENT_POLICIES")
+
+# dedup keys seen in the current request; None outside a request scope
+_request_events: contextvars.ContextVar = contextvars.ContextVar("obs_request_events", default=None)
+
+_counters = {"emitted": 0, "dropped": 0, "suppressed": 0, "written": 0, "exported": 0, "export_failed": 0}
+_queue: "queue.Queue[str]" = queue.Queue(maxsize=max(1, QUEUE_SIZE))
+_worker = None
+_stopping = False
+_log_fh = None
+_log_opened = 0.0
+_compressor = None
+# segments this process rotated (or found left over at startup) and still has to compress
+_to_compress: set = set()
+_processed = 0
+_done = threading.Condition()
+_exporters = None
+
+
+def _count(name: str, n: int = 1):
+    with LOCK:
+        _counters[name] += n
+
+
+def stats() -> dict:
+    """Counters since startup plus the current queue depth."""
+    with LOCK:
+        out = dict(_counters)
+    out["queued"] = _queue.qsize()
+    out["exporters"] = {e.name: e.snapshot() for e in (_exporters or [])}
+    return out
+
+
+def _open_log():
+    global _log_fh, _log_opened
+    first = not _log_opened
+    _log_fh = open(LOG_FILE, "a", encoding="utf-8")
+    _log_opened = time.time()
+    # segments left by a crash; reopening after another worker's rotation leaves its segment to it
+    if first:
+        _start_compressor(event_log.pending_segments(LOG_FILE))
+
+
+def _write_local(lines):
+    try:
+        if _log_fh is None:
+            _open_log()
+        # the shared lock keeps the segment's compressor (exclusive lock) from reading mid-write;
+        # once it has the segment, the inode check sends us to the new live log
+        _flock_log(True)
+        while os.fstat(_log_fh.fileno()).st_ino != _inode(LOG_FILE):
+            # another worker process rotated the file under us
+            _log_fh.close()
+            _open_log()
+            _flock_log(True)
+        try:
+            _log_fh.write("\n".join(lines) + "\n")
+            _log_fh.flush()
+        finally:
+            _flock_log(False)
+        _count("written", len(lines))
+        if (ROTATE_BYTES and _log_fh.tell() >= ROTATE_BYTES) or \
+                (ROTATE_SECONDS and time.time() - _log_opened >= ROTATE_SECONDS):
+            _rotate()
+    except Exception as e:
+        logger.debug("Failed to write local events: %s", e)
+
+
+def _flock_log(shared: bool):
+    if fcntl is not None:
+        fcntl.flock(_log_fh.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_UN)
+
+
+def _inode(path: str):
+    try:
+        return os.stat(path).st_ino
+    except OSError:
+        return None
+
+
+def _rotate():
+    global _log_fh
+    _log_fh.close()
+    _log_fh = None
+    segment = event_log.rotate(LOG_FILE)
+    if segment:
+        _start_compressor([segment])
+
+
+def _compress_pending():
+    global _compressor
+    while True:
+        with LOCK:
+            if not _to_compress:
+                _compressor = None
+                return
+            segment = min(_to_compress)
+            _to_compress.discard(segment)
+        try:
+            # False: another worker claimed it first
+            event_log.compress_segment(segment, LOG_FILE)
+        except Exception as e:
+            logger.warning("Failed to compress %s: %s", segment, e)
 
-ARIZE_API_KEY = os.environ.get("ARIZE_API_KEY")
-ARIZE_API_URL = os.environ.get("ARIZE_API_URL")
 
-def _write_local(event: dict):
-    serialized = json.dumps(event, ensure_ascii=False)
+def _start_compressor(segments):
+    # gzip runs off the writer thread so a rotation doesn't stall the queue
+    global _compressor
     with LOCK:
+        _to_compress.update(segments)
+        if _compressor is not None or not _to_compress:
+            return
+        _compressor = thread = threading.Thread(target=_compress_pending, name="obs-compress", daemon=True)
+    thread.start()
+
+
+def _export(lines):
+    global _exporters
+    if _exporters is None:
+        _exporters = exporters.build_exporters()
+    for exporter in _exporters:
         try:
-            with open(LOG_FILE, "a", encoding="utf-8") as f:
-                f.write(serialized + "\n")
+            sent = exporter.send(lines)
         except Exception as e:
-            logger.debug("Failed to write local event: %s", e)
+            logger.debug("%s export failed: %s", exporter.name, e)
+            sent = 0
+        _count("exported", sent)
+        _count("export_failed", len(lines) - sent)
+
+
+def _deliver(lines):
+    global _processed
+    with _done:
+        _write_local(lines)
+    _export(lines)
+    with _done:
+        _processed += len(lines)
+        _done.notify_all()
+
+
+def _run():
+    interval = max(FLUSH_INTERVAL_MS, 1) / 1000.0
+    while True:
+        try:
+            first = _queue.get(timeout=interval)
+        except queue.Empty:
+            if _stopping:
+                return
+            continue
+        lines = [first]
+        while len(lines) < BATCH_SIZE:
+            try:
+                lines.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        _deliver(lines)
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with LOCK:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name="obs-writer", daemon=True)
+            _worker.start()
+
+
+def _enqueue(line: str) -> bool:
+    if QUEUE_POLICY == "block":
+        try:
+            _queue.put(line, timeout=BLOCK_TIMEOUT_MS / 1000.0)
+            return True
+        except queue.Full:
+            return False
+    while True:
+        try:
+            _queue.put_nowait(line)
+            return True
+        except queue.Full:
+            if QUEUE_POLICY != "drop_oldest":
+                return False
+        try:
+            _queue.get_nowait()
+            _count("dropped")
+        except queue.Empty:
+            pass
+
+
+def _policy_for(name: str):
+    policy = EVENT_POLICIES.get(name)
+    if policy is None and ":" in name:
+        policy = EVENT_POLICIES.get(name.split(":", 1)[0] + ":*")
+    return policy
+
+
+def _apply_policy(name: str, payload, policy: dict):
+    """Returns the payload to log, or None to suppress the event. Never mutates `payload`."""
+    sample = policy.get("sample")
+    if sample is not None and random.random() >= sample:
+        return None
+    if not isinstance(payload, dict):
+        return payload
+    out = payload
+    for field in policy.get("slim") or ():
+        value = out.get(field)
+        if isinstance(value, dict):
+            out = {k: v for k, v in out.items() if k != field}
+            out.setdefault(f"{field}_id", value.get("id"))
+    for field in policy.get("redact") or ():
+        if field in out:
+            out = dict(out, **{field: "[redacted]"})
+    for field, limit in (policy.get("truncate") or {}).items():
+        value = out.get(field)
+        if isinstance(value, str) and len(value) > limit:
+            # keep the tail: for tracebacks that's where the exception is
+            out = dict(out, **{field: value[-limit:]})
+    dedup_on = policy.get("dedup_on")
+    seen = _request_events.get()
+    if dedup_on and seen is not None:
+        key = (name,) + tuple(str(out.get(f)) for f in dedup_on)
+        if key in seen:
+            return None
+        seen.add(key)
+    return out
+
+
+@contextmanager
+def request_scope():
+    """Events deduplicated by their policy's dedup_on are only logged once inside this block."""
+    token = _request_events.set(set())
+    try:
+        yield
+    finally:
+        _request_events.reset(token)
+
+
+class EventScopeMiddleware:
+    """ASGI middleware that runs each HTTP request inside request_scope()."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with request_scope():
+            await self.app(scope, receive, send)
+
 
 def emit_event(name: str, payload: dict):
+    started = time.perf_counter()
+    policy = _policy_for(name)
+    if policy:
+        payload = _apply_policy(name, payload, policy)
+        if payload is None:
+            _count("suppressed")
+            return
     event = {
         "time": datetime.utcnow().isoformat(),
         "name": name,
         "payload": payload
     }
-   
-    _write_local(event)
+    trace_id = metrics.trace_id()
+    if trace_id:
+        event["trace_id"] = trace_id
+    # serialize on the caller's thread so later changes to `payload` can't leak into the event
+    try:
+        line = json.dumps(event, ensure_ascii=False)
+    except (TypeError, ValueError) as e:
+        logger.debug("Failed to serialize event %s: %s", name, e)
+        return
+    _count("emitted")
 
-    if LANGFUSE_API_KEY and LANGFUSE_API_URL:
-        try:
-            headers = {"x-api-key": LANGFUSE_API_KEY, "Content-Type": "application/json"}
-            requests.post(f"{LANGFUSE_API_URL}/events", headers=headers, json=event, timeout=2)
-        except Exception as e:
-            logger.debug("Langfuse emit failed: %s", e)
-            
-    if ARIZE_API_KEY and ARIZE_API_URL:
-        try:
-            headers = {"Authorization": f"Bearer {ARIZE_API_KEY}", "Content-Type": "application/json"}
-            requests.post(ARIZE_API_URL.rstrip("/") + "/events", headers=headers, json=event, timeout=2)
-        except Exception as e:
-            logger.debug("Arize emit failed: %s", e)
\ No newline at end of file
+    if not ASYNC or _stopping:
+        _deliver([line])
+    else:
+        _ensure_worker()
+        if not _enqueue(line):
+            _count("dropped")
+    metrics.observe("emit_event_seconds", time.perf_counter() - started)
+
+
+def flush(timeout: float = 5.0) -> bool:
+    """Wait until everything emitted so far has been written and exported; False on timeout."""
+    with LOCK:
+        target = _counters["emitted"]
+    deadline = time.monotonic() + timeout
+    with _done:
+        # every emitted event is eventually delivered or dropped
+        while _processed + stats()["dropped"] < target:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            _done.wait(remaining)
+    return True
+
+
+def shutdown(timeout: float = 5.0):
+    """Drain the queue, stop the worker and close the log file. Later events are written inline."""
+    global _stopping, _log_fh, _exporters
+    flush(timeout)
+    _stopping = True
+    if _worker is not None:
+        _worker.join(timeout)
+    compressor = _compressor
+    if compressor is not None:
+        compressor.join(timeout)
+    with _done:
+        if _log_fh is not None:
+            try:
+                _log_fh.close()
+            except Exception:
+                pass
+            _log_fh = None
+        for exporter in _exporters or []:
+            exporter.close()
+        _exporters = None
+
+
+atexit.register(shutdown)
@@ -0,0 +1,175 @@
+"""
+Bounded LRU cache for parse results, with a per-entry TTL and an optional
+SQLite tier so entries survive restarts.
+
+Keys combine the whitespace-normalized text with a bucket of the reference
+time. Buckets never span midnight, so "tomorrow" parsed at 23:59 is never
+served for a request made at 00:01.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+MAX_ENTRIES = int(os.environ.get("PARSE_CACHE_MAX_ENTRIES", "4096"))
+TTL_SECONDS = float(os.environ.get("PARSE_CACHE_TTL_SECONDS", "3600"))
+# width of the reference-time bucket; results may depend on the time of day (dateutil fills missing fields from it)
+BUCKET_SECONDS = int(os.environ.get("PARSE_CACHE_BUCKET_SECONDS", "300"))
+# empty disables the disk tier
+DB_FILE = os.environ.get("PARSE_CACHE_DB", "")
+DB_MAX_ENTRIES = int(os.environ.get("PARSE_CACHE_DB_MAX_ENTRIES", "100000"))
+# prune expired / surplus disk rows every N writes
+DB_PRUNE_EVERY = 500
+
+
+def normalize(text: str) -> str:
+    # case is kept: titles are taken verbatim from the text
+    return " ".join((text or "").split())
+
+
+def time_bucket(ref: datetime, seconds: int = BUCKET_SECONDS) -> Tuple[str, int]:
+    """(day, bucket within the day) for a reference time; the last bucket of a day ends at midnight."""
+    since_midnight = ref.hour * 3600 + ref.minute * 60 + ref.second
+    return ref.date().isoformat(), since_midnight // max(1, seconds)
+
+
+def seconds_left_in_bucket(ref: datetime, seconds: int = BUCKET_SECONDS) -> float:
+    seconds = max(1, seconds)
+    since_midnight = ref.hour * 3600 + ref.minute * 60 + ref.second + ref.microsecond / 1e6
+    end = min(86400, (int(since_midnight) // seconds + 1) * seconds)
+    return end - since_midnight
+
+
+class ParseCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: float = TTL_SECONDS, db_path: str = DB_FILE,
+                 db_max_entries: int = DB_MAX_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.db_max_entries = db_max_entries
+        self._lock = threading.Lock()
+        # key -> (expires_at, json value); values are stored serialized so callers can't mutate cached results
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "disk_hits": 0, "disk_errors": 0}
+        self._writes = 0
+        self._conn = None
+        if db_path:
+            try:
+                d = os.path.dirname(db_path)
+                if d:
+                    os.makedirs(d, exist_ok=True)
+                self._conn = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS parse_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_parse_cache_expires ON parse_cache (expires)")
+                self._conn.commit()
+            except sqlite3.Error:
+                self._conn = None
+                self._stats["disk_errors"] += 1
+
+    @staticmethod
+    def key(namespace: str, text: str, ref: datetime, bucket_seconds: int = BUCKET_SECONDS) -> str:
+        day, bucket = time_bucket(ref, bucket_seconds)
+        return json.dumps([namespace, day, bucket, normalize(text)], separators=(",", ":"))
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return json.loads(entry[1])
+                del self._entries[key]
+                self._stats["expired"] += 1
+            entry = self._disk_get(key, now)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._stats["disk_hits"] += 1
+            self._insert(key, entry)
+            return json.loads(entry[1])
+
+    def put(self, key: str, value: Dict, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        entry = (time.time() + ttl, json.dumps(value, separators=(",", ":"), default=str))
+        with self._lock:
+            self._insert(key, entry)
+            self._disk_put(key, entry)
+
+    def _insert(self, key: str, entry: Tuple[float, str]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+        if self._conn is None:
+            return None
+        try:
+            row = self._conn.execute("SELECT expires, value FROM parse_cache WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            self._stats["disk_errors"] += 1
+            return None
+        if row is None:
+            return None
+        if row[0] <= now:
+            self._stats["expired"] += 1
+            return None
+        return row[0], row[1]
+
+    def _disk_put(self, key: str, entry: Tuple[float, str]):
+        if self._conn is None:
+            return
+        try:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO parse_cache (key, value, expires) VALUES (?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires",
+                    (key, entry[1], entry[0]))
+                self._writes += 1
+                if self._writes % DB_PRUNE_EVERY == 0:
+                    self._prune_disk()
+        except sqlite3.Error:
+            self._stats["disk_errors"] += 1
+
+    def _prune_disk(self):
+        self._conn.execute("DELETE FROM parse_cache WHERE expires <= ?", (time.time(),))
+        # then the entries closest to expiry, down to the cap
+        self._conn.execute(
+            "DELETE FROM parse_cache WHERE key IN (SELECT key FROM parse_cache ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+            (self.db_max_entries,))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._conn is not None:
+                try:
+                    with self._conn:
+                        self._conn.execute("DELETE FROM parse_cache")
+                except sqlite3.Error:
+                    self._stats["disk_errors"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["entries"] = len(self._entries)
+        lookups = out["hits"] + out["misses"]
+        out["hit_ratio"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+        return out
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,211 @@
+"""
+Replay recorded `user_input` events against the app in-process (httpx ASGI
+transport, no network) and report throughput and latency percentiles per
+endpoint and intent.
+
+    python replay_load.py --mode max --concurrency 16
+    python replay_load.py --mode accelerated --speed 60 --since 7d
+    python replay_load.py --mode original --file events.log.20240101T000000.gz --with-list
+
+Requests of one user are replayed in their recorded order; different users
+run concurrently. Tasks, shards and the replay's own events go to a temporary
+directory so the source log and real task files are never touched.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+def _configure_env(workdir: str):
+    # must happen before `app` (and the modules it imports) read their config
+    os.environ["OBS_LOG_FILE"] = os.path.join(workdir, "events.log")
+    os.environ["TASKS_FILE"] = os.path.join(workdir, "tasks.json")
+    os.environ["TASKS_SHARD_DIR"] = os.path.join(workdir, "users")
+    os.environ["TASKS_SQLITE_FILE"] = os.path.join(workdir, "tasks.db")
+    os.environ.setdefault("USE_OPENAI", "false")
+
+
+def load_inputs(log_file: str, files: Optional[List[str]], since=None, until=None, limit: Optional[int] = None) -> List[Dict]:
+    import event_log
+    import event_query
+
+    if files:
+        events = event_query.select(event_query.iter_files(files), ["user_input"], None, since, until)
+    else:
+        events = event_log.iter_events(log_file, ["user_input"], since, until)
+    out = []
+    for event in events:
+        payload = event.get("payload") or {}
+        text, user = payload.get("text"), payload.get("user")
+        if not text or not user:
+            continue
+        try:
+            t = datetime.fromisoformat(event["time"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        out.append({"time": t, "user": user, "text": text, "persona": payload.get("persona")})
+        if limit and len(out) >= limit:
+            break
+    out.sort(key=lambda r: r["time"])
+    return out
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[tuple, List[float]] = defaultdict(list)
+        self.errors: Dict[tuple, int] = defaultdict(int)
+
+    def add(self, endpoint: str, intent: str, seconds: float, ok: bool):
+        self.samples[(endpoint, intent)].append(seconds)
+        if not ok:
+            self.errors[(endpoint, intent)] += 1
+
+    def report(self, elapsed: float) -> List[Dict]:
+        rows = []
+        keys = sorted(self.samples, key=lambda k: (k[0], -len(self.samples[k])))
+        for endpoint in sorted({k[0] for k in keys}):
+            merged = sorted(v for k in keys if k[0] == endpoint for v in self.samples[k])
+            rows.append(self._row(endpoint, "*", merged, sum(self.errors[k] for k in keys if k[0] == endpoint), elapsed))
+            for key in (k for k in keys if k[0] == endpoint):
+                rows.append(self._row(endpoint, key[1], sorted(self.samples[key]), self.errors[key], elapsed))
+        return rows
+
+    @staticmethod
+    def _row(endpoint, intent, values, errors, elapsed):
+        return {
+            "endpoint": endpoint, "intent": intent, "count": len(values), "errors": errors,
+            "rps": round(len(values) / elapsed, 1) if elapsed > 0 else None,
+            "p50_ms": round(_percentile(values, 0.50) * 1000, 2),
+            "p95_ms": round(_percentile(values, 0.95) * 1000, 2),
+            "p99_ms": round(_percentile(values, 0.99) * 1000, 2),
+            "max_ms": round((values[-1] if values else 0) * 1000, 2),
+        }
+
+
+async def _replay(inputs: List[Dict], args) -> tuple:
+    import httpx
+    import app as app_module
+    import nlu
+
+    intents = {}
+    for rec in inputs:
+        if rec["text"] not in intents:
+            intents[rec["text"]] = nlu.parse_goal(rec["text"]).get("intent") or "unknown"
+
+    recorder = Recorder()
+    transport = httpx.ASGITransport(app=app_module.app)
+    user_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+    limiter = asyncio.Semaphore(max(1, args.concurrency))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=60) as client:
+        async def timed(endpoint: str, intent: str, coro):
+            started = time.perf_counter()
+            ok = False
+            try:
+                resp = await coro
+                ok = resp.status_code < 400 and not (resp.headers.get("content-type", "").startswith("application/json")
+                                                     and resp.json().get("status") == "error")
+            except Exception as e:
+                print(f"request failed: {e}", file=sys.stderr)
+            recorder.add(endpoint, intent, time.perf_counter() - started, ok)
+
+        async def send(rec: Dict):
+            user = args.user_prefix + rec["user"]
+            body = {"user_id": user, "goal": rec["text"]}
+            if rec.get("persona"):
+                body["persona"] = rec["persona"]
+            intent = intents[rec["text"]]
+            async with limiter:
+                await timed("POST /mcp/act", intent, client.post("/mcp/act", json=body))
+                if args.with_list:
+                    await timed("GET /tasks", "-", client.get("/tasks", params={"user_id": user}))
+
+        async def send_in_order(rec: Dict, lock: asyncio.Lock):
+            async with lock:
+                await send(rec)
+
+        started = time.perf_counter()
+        if args.mode == "max":
+            by_user: Dict[str, List[Dict]] = defaultdict(list)
+            for rec in inputs:
+                by_user[rec["user"]].append(rec)
+
+            async def run_user(recs):
+                for rec in recs:
+                    await send(rec)
+            await asyncio.gather(*(run_user(recs) for recs in by_user.values()))
+        else:
+            speed = args.speed if args.mode == "accelerated" else 1.0
+            origin = inputs[0]["time"]
+            pending = []
+            for rec in inputs:
+                delay = (rec["time"] - origin).total_seconds() / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                # taking the lock here, in arrival order, keeps each user's requests ordered
+                lock = user_locks[rec["user"]]
+                pending.append(asyncio.ensure_future(send_in_order(rec, lock)))
+                await asyncio.sleep(0)
+            await asyncio.gather(*pending)
+        elapsed = time.perf_counter() - started
+    return recorder, elapsed
+
+
+def main():
+    import event_query
+
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--log", default=os.environ.get("OBS_LOG_FILE", "events.log"), help="recorded log (rotated segments included)")
+    ap.add_argument("--file", action="append", help="read user_input events from these files (.gz ok) instead")
+    ap.add_argument("--since", type=event_query.parse_when, help="ISO time or relative age (24h, 7d)")
+    ap.add_argument("--until", type=event_query.parse_when)
+    ap.add_argument("--limit", type=int, help="replay at most N inputs")
+    ap.add_argument("--repeat", type=int, default=1, help="replay the recording N times back to back")
+    ap.add_argument("--mode", choices=["original", "accelerated", "max"], default="max")
+    ap.add_argument("--speed", type=float, default=10.0, help="time compression factor for --mode accelerated")
+    ap.add_argument("--concurrency", type=int, default=8, help="requests in flight at most")
+    ap.add_argument("--with-list", action="store_true", help="also GET /tasks after every act, like the UI does")
+    ap.add_argument("--user-prefix", default="replay-", help="prefix for replayed user ids")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    inputs = load_inputs(os.path.abspath(args.log), args.file, args.since, args.until, args.limit)
+    if not inputs:
+        raise SystemExit("no user_input events found")
+    if args.repeat > 1:
+        span = inputs[-1]["time"] - inputs[0]["time"]
+        inputs = [dict(rec, time=rec["time"] + (span * i)) for i in range(args.repeat) for rec in inputs]
+
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    _configure_env(workdir)
+    recorder, elapsed = asyncio.run(_replay(inputs, args))
+
+    rows = recorder.report(elapsed)
+    if args.json:
+        print(json.dumps({"mode": args.mode, "requests": sum(r["count"] for r in rows if r["intent"] == "*"),
+                          "elapsed_s": round(elapsed, 3), "rows": rows}))
+        return
+    total = sum(r["count"] for r in rows if r["intent"] == "*")
+    print(f"{len(inputs)} inputs, {total} requests in {elapsed:.2f}s ({total / elapsed:.1f} req/s), mode={args.mode} -> {workdir}")
+    cols = ["endpoint", "intent", "count", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in cols]
+    print("  ".join(c.ljust(w) for c, w in zip(cols, widths)))
+    for r in rows:
+        print("  ".join(str(r[c]).ljust(w) for c, w in zip(cols, widths)))
+
+
+if __name__ == "__main__":
+    main()
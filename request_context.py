@@ -0,0 +1,95 @@
+"""
+Per-request state for /mcp/act: the user's text is parsed at most once and
+the result is shared by intent routing, agent.run_agent and the tool
+dispatcher.
+
+    ctx = request_context.start(user_id, user_input, persona)
+    parsed = ctx.parse()        # later calls (and request_context.parse(text)) reuse it
+    ...
+    request_context.finish(ctx) # records parses / model calls for the request
+"""
+import contextvars
+from datetime import datetime
+from typing import Dict, Optional
+
+import llm_nlu
+import metrics
+
+# parse sources that cost a model round trip (see llm_nlu.parse_goal_with_source)
+MODEL_SOURCES = ("model", "fallback", "deadline")
+
+_current: contextvars.ContextVar = contextvars.ContextVar("request_context", default=None)
+
+
+class RequestContext:
+    __slots__ = ("user_id", "text", "persona", "ref", "parsed", "parse_source", "parse_origin", "parses",
+                 "model_calls", "_token")
+
+    def __init__(self, user_id: str, text: str, persona: Optional[str] = None, ref: Optional[datetime] = None):
+        self.user_id = user_id
+        self.text = text
+        self.persona = persona
+        self.ref = ref or datetime.utcnow()
+        self.parsed: Optional[Dict] = None
+        self.parse_source: Optional[str] = None
+        self.parse_origin: Optional[str] = None
+        self.parses = 0
+        self.model_calls = 0
+        self._token = None
+
+    def parse(self) -> Dict:
+        if self.parsed is None:
+            self.parsed, self.parse_source, self.parse_origin = llm_nlu.parse_goal_with_source(self.text, self.ref)
+            self.parses += 1
+            metrics.inc("goal_parses_total", source=self.parse_source)
+            if self.parse_source in MODEL_SOURCES:
+                self.model_calls += 1
+        return self.parsed
+
+    @property
+    def parsed_by_model(self) -> bool:
+        # cache hits carry the origin of the parse that filled them, so a retry routes like the first try
+        return self.parse_origin == "model"
+
+    def model_call(self, kind: str):
+        """Count a model round trip made on behalf of this request outside of parse()."""
+        self.model_calls += 1
+        metrics.inc("model_calls_total", kind=kind)
+
+
+def current() -> Optional[RequestContext]:
+    return _current.get()
+
+
+def start(user_id: str, text: str, persona: Optional[str] = None) -> RequestContext:
+    ctx = RequestContext(user_id, text, persona)
+    ctx._token = _current.set(ctx)
+    return ctx
+
+
+def finish(ctx: Optional[RequestContext]):
+    if ctx is None:
+        return
+    if ctx._token is not None:
+        _current.reset(ctx._token)
+        ctx._token = None
+    metrics.inc("act_requests_by_parses_total", parses=ctx.parses, model_calls=ctx.model_calls)
+
+
+def parse(text: str) -> Dict:
+    """Parse `text`, reusing the current request's parse when it is the same text."""
+    ctx = _current.get()
+    if ctx is not None and ctx.text == text:
+        return ctx.parse()
+    parsed, source, _ = llm_nlu.parse_goal_with_source(text)
+    metrics.inc("goal_parses_total", source=source)
+    if ctx is not None:
+        ctx.parses += 1
+        if source in MODEL_SOURCES:
+            ctx.model_calls += 1
+    return parsed
+
+
+metrics.describe("goal_parses_total", "Goal parses by source (cache, model, heuristic, fallback, deadline).")
+metrics.describe("model_calls_total", "Model round trips made outside goal parsing, by kind.")
+metrics.describe("act_requests_by_parses_total", "/mcp/act requests by number of goal parses and model calls.")
@@ -1,12 +1,12 @@
 
 
 def reflect(user_id, memory, calendar):
-    tasks = memory.list_all()
+    counts = memory.count_by_status()
+    total = sum(counts.values())
+    done = counts.get("done", 0)
+    pending = total - done
 
-    done = [t for t in tasks if t["status"] == "done"]
-    pending = [t for t in tasks if t["status"] != "done"]
-
-    if not tasks:
+    if not total:
         return {
             "message": "You have no tasks yet. Let’s plan something."
         }
@@ -14,8 +14,8 @@ def reflect(user_id, memory, calendar):
     return {
         "message": (
             f"🧠 Self-reflection complete.\n\n"
-            f"✅ Completed: {len(done)}\n"
-            f"⏳ Pending: {len(pending)}\n\n"
+            f"✅ Completed: {done}\n"
+            f"⏳ Pending: {pending}\n\n"
             f"Focus next on your highest-priority pending task."
         )
     }
@@ -12,6 +12,10 @@ if "messages" not in st.session_state:
     st.session_state.messages = [{"role": "assistant", "text": "👋 Hi — I'm your AI assistant."}]
 if "tasks" not in st.session_state:
     st.session_state.tasks = []
+if "tasks_version" not in st.session_state:
+    st.session_state.tasks_version = None
+if "tasks_user" not in st.session_state:
+    st.session_state.tasks_user = None
 if "awaiting_time" not in st.session_state:
     st.session_state.awaiting_time = False
 if "pending_task_id" not in st.session_state:
@@ -27,15 +31,49 @@ if "user_id_input" not in st.session_state:
 if "user_input" not in st.session_state:
     st.session_state.user_input = ""
 
-def fetch_tasks():
+def _fetch_all_tasks(user_id: str):
+    params = {"user_id": user_id, "limit": 200, "fields": "id,title,status,start"}
+    tasks = []
+    version = None
     try:
-        r = requests.get(f"{API_BASE}/tasks", timeout=5)
-        if r.status_code == 200:
-            st.session_state.tasks = r.json().get("result", {}).get("tasks", [])
-        else:
-            st.session_state.tasks = []
+        while True:
+            r = requests.get(f"{API_BASE}/tasks", params=params, timeout=5)
+            if r.status_code != 200:
+                tasks, version = [], None
+                break
+            result = r.json().get("result", {})
+            # the first page's version is the sync base; anything that changes while
+            # paging shows up again in the next delta
+            version = version or result.get("version")
+            tasks.extend(result.get("tasks", []))
+            if not result.get("next_cursor"):
+                break
+            params["cursor"] = result["next_cursor"]
     except Exception:
-        st.session_state.tasks = []
+        tasks, version = [], None
+    st.session_state.tasks = tasks
+    st.session_state.tasks_version = version
+    st.session_state.tasks_user = user_id
+
+def fetch_tasks(user_id: str):
+    if st.session_state.tasks_user != user_id or not st.session_state.tasks_version:
+        _fetch_all_tasks(user_id)
+        return
+    try:
+        r = requests.get(f"{API_BASE}/tasks/changes",
+                         params={"user_id": user_id, "since": st.session_state.tasks_version}, timeout=5)
+        if r.status_code != 200:
+            return
+        result = r.json().get("result", {})
+    except Exception:
+        return
+    by_id = {} if result.get("full") else {t["id"]: t for t in st.session_state.tasks}
+    for t in result.get("tasks", []):
+        by_id[t["id"]] = t
+    for task_id in result.get("removed", []):
+        by_id.pop(task_id, None)
+    st.session_state.tasks = list(by_id.values())
+    st.session_state.tasks_version = result.get("version")
 
 def call_agent(user_id: str, goal: str, task_id: str = None, persona: str = None):
     payload = {"user_id": user_id, "goal": goal}
@@ -49,9 +87,9 @@ def call_agent(user_id: str, goal: str, task_id: str = None, persona: str = None
     except Exception as e:
         return {"result": {"message": f"Agent unreachable: {e}"}}
 
-def complete_task_api(task_id: str):
+def complete_task_api(task_id: str, user_id: str):
     try:
-        r = requests.post(f"{API_BASE}/tasks/{task_id}/complete", timeout=10)
+        r = requests.post(f"{API_BASE}/tasks/{task_id}/complete", params={"user_id": user_id}, timeout=10)
         if r.status_code == 200:
             return r.json()
         return {"status": "error", "message": r.text}
@@ -113,7 +151,7 @@ def submit():
         st.session_state.messages.append({"role": "assistant", "text": message})
 
     st.session_state.last_raw = res
-    fetch_tasks()
+    fetch_tasks(user_id)
     st.session_state.user_input = ""  
     st.session_state.busy = False
 
@@ -156,7 +194,8 @@ if st.button("Estimate pending effort"):
 
 st.markdown("---")
 st.subheader("Tasks")
-fetch_tasks()
+current_user = st.session_state.get("user_id_input", "demo_user")
+fetch_tasks(current_user)
 if st.session_state.tasks:
     for t in st.session_state.tasks:
         title = t.get("title", "(untitled)")
@@ -167,10 +206,10 @@ if st.session_state.tasks:
         
         if status != "done":
             if cols[1].button("✅", key=f"done-{t['id']}"):
-                resp = complete_task_api(t["id"])
+                resp = complete_task_api(t["id"], current_user)
                 if resp.get("status") == "ok" or resp.get("status") is None:
                     st.success("Task completed")
-                    fetch_tasks()
+                    fetch_tasks(current_user)
                 else:
                     st.error(resp.get("message", "Failed to complete task"))
 else:
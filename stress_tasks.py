@@ -0,0 +1,63 @@
+"""
+Multi-process stress check for TaskMemory's concurrency-safe mode.
+
+Spawns several worker processes that share one task file and hammer
+add_task/complete_task, then verifies that no task or completion was lost:
+
+    python stress_tasks.py --workers 4 --tasks 200 --storage journal
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+
+def _worker(file_path: str, storage: str, worker_id: int, n_tasks: int):
+    from task_memory import TaskMemory
+
+    memory = TaskMemory(file_path, storage, multiprocess=True)
+    for i in range(n_tasks):
+        task = memory.add_task(f"worker {worker_id} task {i}")
+        if i % 2 == 0:
+            memory.complete_task(task.id)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--tasks", type=int, default=200, help="tasks added per worker")
+    ap.add_argument("--storage", default="json", choices=["json", "journal", "sqlite"])
+    args = ap.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="tasks-stress-")
+    file_path = os.path.join(workdir, "tasks.json")
+    os.environ.setdefault("OBS_LOG_FILE", os.path.join(workdir, "events.log"))
+    os.environ.setdefault("TASKS_SQLITE_FILE", os.path.join(workdir, "tasks.db"))
+
+    started = time.perf_counter()
+    procs = [multiprocessing.Process(target=_worker, args=(file_path, args.storage, w, args.tasks))
+             for w in range(args.workers)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - started
+
+    from task_memory import TaskMemory
+
+    tasks = TaskMemory(file_path, args.storage, multiprocess=True).list_all()
+    expected = args.workers * args.tasks
+    expected_done = args.workers * ((args.tasks + 1) // 2)
+    done = sum(1 for t in tasks if t["status"] == "done")
+    ops = expected + expected_done
+    print(f"{args.workers} workers, {ops} mutations in {elapsed:.2f}s ({ops / elapsed:.0f} ops/s) -> {workdir}")
+    print(f"tasks: {len(tasks)}/{expected}  done: {done}/{expected_done}")
+    failed = [p.exitcode for p in procs if p.exitcode]
+    if len(tasks) != expected or done != expected_done or failed:
+        raise SystemExit("FAILED: lost updates or crashed workers")
+    print("OK: no lost updates")
+
+
+if __name__ == "__main__":
+    main()
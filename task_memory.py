@@ -1,13 +1,45 @@
 
+import base64
+import functools
 import json
 import os
 import uuid
 import re
-from datetime import datetime
-from typing import List, Optional, Dict
+import hashlib
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional, Dict, Sequence, Tuple
 from observability import emit_event
+import metrics
+from task_store import TaskArchive, make_store
 
 DATA_FILE = os.environ.get("TASKS_FILE", "data/tasks.json")
+# "json" rewrites the whole file per mutation; "journal" appends records and compacts periodically;
+# "sqlite" keeps every user's tasks in one WAL-mode database (TASKS_SQLITE_FILE)
+STORAGE_MODE = os.environ.get("TASKS_STORAGE", "json")
+# set when several worker processes share the same task files (uvicorn --workers N)
+MULTIPROCESS = os.environ.get("TASKS_MULTIPROCESS", "false").lower() in ("1", "true", "yes")
+DEDUP_WINDOW_SECONDS = int(os.environ.get("TASK_DEDUP_WINDOW_SECONDS", "120"))
+# recent (version, task_id) entries kept for delta sync; older clients get a full resync
+CHANGE_LOG_SIZE = int(os.environ.get("TASKS_CHANGE_LOG_SIZE", "10000"))
+
+# done tasks completed longer ago than this move to the gzip archive; 0 keeps them hot forever
+ARCHIVE_AFTER_DAYS = float(os.environ.get("TASKS_ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_CHECK_SECONDS = 3600
+
+# per-user shards managed by TaskMemoryManager
+SHARD_DIR = os.environ.get("TASKS_SHARD_DIR", os.path.join(os.path.dirname(DATA_FILE), "users"))
+SHARD_BUDGET_TASKS = int(os.environ.get("TASKS_SHARD_BUDGET_TASKS", "200000"))
+SHARD_IDLE_SECONDS = int(os.environ.get("TASKS_SHARD_IDLE_SECONDS", "1800"))
+# shards touched this recently are never evicted, so in-flight requests keep a live object
+SHARD_GRACE_SECONDS = 30
+# user whose shard is seeded from the pre-sharding TASKS_FILE on first access
+LEGACY_OWNER = os.environ.get("TASKS_LEGACY_OWNER")
 
 def _normalize_title(title: str) -> str:
     if not title:
@@ -17,112 +49,574 @@ def _normalize_title(title: str) -> str:
     t = re.sub(r"\s+", " ", t)
     return t
 
+def _parse_iso(value) -> Optional[datetime]:
+    """Parse an ISO timestamp into a naive UTC datetime so mixed formats compare cleanly."""
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, str) and value:
+        try:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+def _as_int(value, default: int) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+def encode_cursor(created: datetime, task_id: str) -> str:
+    raw = f"{created.isoformat()}|{task_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created, task_id = raw.split("|", 1)
+        return datetime.fromisoformat(created), task_id
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+def _parse_bound(value, name: str) -> Optional[datetime]:
+    """A start_from/start_to filter: None when absent, ValueError when given but unparseable."""
+    if value is None or value == "":
+        return None
+    dt = _parse_iso(value)
+    if dt is None:
+        raise ValueError(f"Invalid {name}")
+    return dt
+
 class Task:
+    """
+    A task record. Slots keep instances small; created_at/start/end are also
+    held as parsed datetimes, and the dict/JSON forms are cached until the next
+    attribute assignment.
+    """
+
+    FIELDS = ("id", "title", "priority", "estimated_minutes", "status", "start", "end",
+              "pending_time", "created_at", "completed_at", "deduped")
+    _PARSED = {"created_at": "_created_dt", "completed_at": "_completed_dt", "start": "_start_dt", "end": "_end_dt"}
+
+    __slots__ = FIELDS + ("_norm_title", "_created_dt", "_completed_dt", "_start_dt", "_end_dt", "_dict", "_json")
+
     def __init__(self, title: str, priority: int = 3, estimated_minutes: int = 60,
                  status: str = "pending", start: Optional[str] = None, end: Optional[str] = None,
                  pending_time: bool = False):
-        self.id = str(uuid.uuid4())
-        self.title = title
-        self._norm_title = _normalize_title(title)
-        self.priority = priority
-        self.estimated_minutes = estimated_minutes
-        self.status = status
-        self.start = start
-        self.end = end
-        self.pending_time = pending_time
-        self.created_at = datetime.utcnow().isoformat()
-        self.deduped = False
+        now = datetime.utcnow()
+        init = object.__setattr__
+        init(self, "id", str(uuid.uuid4()))
+        init(self, "title", title)
+        init(self, "_norm_title", _normalize_title(title))
+        init(self, "priority", priority)
+        init(self, "estimated_minutes", estimated_minutes)
+        init(self, "status", status)
+        init(self, "start", start)
+        init(self, "_start_dt", _parse_iso(start))
+        init(self, "end", end)
+        init(self, "_end_dt", _parse_iso(end))
+        init(self, "pending_time", pending_time)
+        init(self, "created_at", now.isoformat())
+        init(self, "_created_dt", now)
+        init(self, "completed_at", None)
+        init(self, "_completed_dt", None)
+        init(self, "deduped", False)
+        init(self, "_dict", None)
+        init(self, "_json", None)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Task":
+        task = cls.__new__(cls)
+        init = object.__setattr__
+        for name in cls.FIELDS:
+            init(task, name, data.get(name))
+        if task.priority is None:
+            init(task, "priority", 3)
+        if task.estimated_minutes is None:
+            init(task, "estimated_minutes", 60)
+        if task.status is None:
+            init(task, "status", "pending")
+        init(task, "pending_time", bool(task.pending_time))
+        init(task, "deduped", bool(task.deduped))
+        init(task, "_norm_title", _normalize_title(task.title))
+        for name, parsed in cls._PARSED.items():
+            init(task, parsed, _parse_iso(getattr(task, name)))
+        init(task, "_dict", None)
+        init(task, "_json", None)
+        return task
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name[0] == "_":
+            return
+        object.__setattr__(self, "_dict", None)
+        object.__setattr__(self, "_json", None)
+        parsed = self._PARSED.get(name)
+        if parsed:
+            object.__setattr__(self, parsed, _parse_iso(value))
+        elif name == "title":
+            object.__setattr__(self, "_norm_title", _normalize_title(value))
+
+    def created_key(self) -> Tuple[datetime, str]:
+        """Stable sort/cursor key: creation time, then id."""
+        return (self._created_dt or datetime.min, self.id)
 
     def to_dict(self) -> Dict:
-        d = self.__dict__.copy()
-        d.pop("_norm_title", None)
-        return d
+        # shared between callers until the next mutation; treat it as read-only
+        if self._dict is None:
+            object.__setattr__(self, "_dict", {name: getattr(self, name) for name in self.FIELDS})
+        return self._dict
+
+    def to_json(self) -> str:
+        if self._json is None:
+            object.__setattr__(self, "_json", json.dumps(self.to_dict(), separators=(",", ":")))
+        return self._json
+
+class DedupIndex:
+    """
+    Recently created tasks keyed by (normalized title, pending_time).
+    Entries older than the window are expired from the front of a FIFO, so
+    lookups only ever touch tasks that can still match.
+    """
+
+    def __init__(self, window_seconds: int = DEDUP_WINDOW_SECONDS):
+        self.window = timedelta(seconds=window_seconds)
+        self._entries: Dict[Tuple[str, bool], Dict[str, datetime]] = {}
+        self._key_of: Dict[str, Tuple[str, bool]] = {}
+        self._fifo = deque()
+
+    def add(self, task_id: str, key: Tuple[str, bool], created: Optional[datetime], now: datetime):
+        self.discard(task_id)
+        if created is None or now - created > self.window:
+            return
+        self._entries.setdefault(key, {})[task_id] = created
+        self._key_of[task_id] = key
+        self._fifo.append((created, task_id))
+
+    def discard(self, task_id: str):
+        key = self._key_of.pop(task_id, None)
+        if key is None:
+            return
+        bucket = self._entries.get(key)
+        if bucket is not None:
+            bucket.pop(task_id, None)
+            if not bucket:
+                del self._entries[key]
+
+    def _expire(self, now: datetime):
+        cutoff = now - self.window
+        while self._fifo and self._fifo[0][0] < cutoff:
+            created, task_id = self._fifo.popleft()
+            key = self._key_of.get(task_id)
+            if key is not None and self._entries[key].get(task_id) == created:
+                self.discard(task_id)
+
+    def lookup(self, key: Tuple[str, bool], now: datetime) -> Optional[str]:
+        self._expire(now)
+        bucket = self._entries.get(key)
+        if not bucket:
+            return None
+        cutoff = now - self.window
+        live = [(created, task_id) for task_id, created in bucket.items() if created >= cutoff]
+        return min(live)[1] if live else None
+
+def _mutation(fn):
+    """Run a TaskMemory mutation under the store's write lock, on top of the latest committed state."""
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        with self._write_lock():
+            self._refresh()
+            result = fn(self, *args, **kwargs)
+            self._maybe_archive()
+            return result
+    return wrapper
 
 class TaskMemory:
-    def __init__(self, file_path: str = DATA_FILE):
+    def __init__(self, file_path: str = DATA_FILE, storage_mode: str = STORAGE_MODE, user_id: str = "",
+                 multiprocess: bool = MULTIPROCESS):
         self.file_path = file_path
+        self.user_id = user_id
         self.tasks: List[Task] = []
+        self._by_id: Dict[str, Task] = {}
+        self._seq: Dict[str, int] = {}
+        self._by_status: Dict[str, Dict[str, Task]] = {}
+        self._by_start: List[Tuple[datetime, str]] = []
+        self._by_created: List[Tuple[datetime, str]] = []
+        # running aggregates over tasks that are not done
+        self._open_by_priority: List[Tuple[int, int, str]] = []
+        self._open_minutes = 0
+        self._dedup = DedupIndex()
+        self._batch: Optional[Dict] = None
+        # version tokens carry a per-instance epoch so a restarted process or another
+        # worker never answers "unchanged" for a version number it didn't issue
+        self._epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+        self._changes = deque(maxlen=CHANGE_LOG_SIZE)
+        self._store = make_store(file_path, storage_mode, user_id, multiprocess)
+        self._store_changed = getattr(self._store, "changed", None)
+        # stores without a write lock of their own still get one: mutations arrive from the event
+        # loop, the threadpool and the group-commit thread
+        self._mutex = threading.RLock()
+        self._write_lock = getattr(self._store, "write_lock", None) or (lambda: self._mutex)
+        self._archive = TaskArchive(file_path)
+        self._next_archive_check = 0.0
         self._load()
+        self.archive_completed()
 
     def _load(self):
-        d = os.path.dirname(self.file_path)
-        if d:
-            os.makedirs(d, exist_ok=True)
-        if not os.path.exists(self.file_path):
-            self._save()
+        self.tasks = [self._from_dict(t) for t in self._store.load()]
+        self._rebuild_indexes()
+
+    def _refresh(self):
+        # stores shared with other processes report external commits; reload so reads aren't stale
+        if self._store_changed is None or not self._store_changed():
             return
-        with open(self.file_path, "r", encoding="utf-8") as f:
+        # the reload replaces every index, so it must not run under another thread's mutation; that
+        # mutation may also be what changed() saw, so check again once we hold the lock
+        with self._write_lock():
+            if self._batch is not None or not self._store_changed():
+                return
+            before = {t.id: t.to_json() for t in self.tasks}
+            self._load()
+            changed = [t.id for t in self.tasks if before.pop(t.id, None) != t.to_json()]
+            changed.extend(before)
+            if changed:
+                self._record_changes(changed)
+
+    def _record_changes(self, task_ids):
+        self.version += 1
+        for task_id in task_ids:
+            self._changes.append((self.version, task_id))
+
+    def _rebuild_indexes(self):
+        self._by_id = {}
+        self._seq = {}
+        self._by_status = {}
+        self._by_start = []
+        self._by_created = []
+        self._open_by_priority = []
+        self._open_minutes = 0
+        self._dedup = DedupIndex()
+        for t in self.tasks:
+            self._index(t)
+
+    def _index(self, task: Task):
+        self._by_id[task.id] = task
+        self._seq.setdefault(task.id, len(self._seq))
+        self._by_status.setdefault(task.status, {})[task.id] = task
+        if task._start_dt is not None:
+            insort(self._by_start, (task._start_dt, task.id))
+        insort(self._by_created, task.created_key())
+        if task.status != "done":
+            insort(self._open_by_priority, self._priority_key(task))
+            self._open_minutes += _as_int(task.estimated_minutes, 60)
+        self._dedup.add(task.id, (task._norm_title, task.pending_time), task._created_dt, datetime.utcnow())
+
+    def _priority_key(self, task: Task) -> Tuple[int, int, str]:
+        return (_as_int(task.priority, 3), self._seq[task.id], task.id)
+
+    def _unindex(self, task: Task):
+        bucket = self._by_status.get(task.status)
+        if bucket is not None:
+            bucket.pop(task.id, None)
+        start = task._start_dt
+        if start is not None:
+            i = bisect_left(self._by_start, (start, task.id))
+            if i < len(self._by_start) and self._by_start[i] == (start, task.id):
+                del self._by_start[i]
+        key = task.created_key()
+        i = bisect_left(self._by_created, key)
+        if i < len(self._by_created) and self._by_created[i] == key:
+            del self._by_created[i]
+        if task.status != "done":
+            key = self._priority_key(task)
+            i = bisect_left(self._open_by_priority, key)
+            if i < len(self._open_by_priority) and self._open_by_priority[i] == key:
+                del self._open_by_priority[i]
+            self._open_minutes -= _as_int(task.estimated_minutes, 60)
+        self._dedup.discard(task.id)
+
+    def close(self):
+        self._store.close()
+
+    def flush(self):
+        """Write any deferred (group-commit) changes now and wait for them to land."""
+        flush = getattr(self._store, "flush", None)
+        if flush is not None:
+            flush()
+
+    def wait_durable(self, timeout: Optional[float] = None) -> bool:
+        """Block until every mutation made so far is persisted; False on timeout."""
+        wait = getattr(self._store, "wait_durable", None)
+        return wait(timeout) if wait is not None else True
+
+    def _persist(self, task: Task, deletes: Tuple[str, ...] = ()):
+        if self._batch is not None:
+            for task_id in deletes:
+                self._batch["tasks"].pop(task_id, None)
+                self._batch["deletes"][task_id] = None
+            self._batch["deletes"].pop(task.id, None)
+            self._batch["tasks"][task.id] = task
+            return
+        with metrics.span("task_store_commit"):
+            self._store.commit([task], list(deletes), self._snapshot)
+        self._record_changes([*deletes, task.id])
+
+    def _emit(self, name: str, payload: Dict):
+        if self.user_id:
+            payload = dict(payload, user=self.user_id)
+        if self._batch is not None:
+            self._batch["events"].append((name, payload))
+            return
+        try:
+            emit_event(name, payload)
+        except Exception:
+            pass
+
+    @contextmanager
+    def batch(self):
+        """
+        Group mutations into one store commit and one aggregated `tasks_batch`
+        event. There is no rollback: if the body raises, the changes applied so
+        far are still committed so disk matches memory. Nested batches join
+        the outermost one.
+        """
+        with self._write_lock():
+            # checked under the lock, so only the thread that opened the batch joins it
+            if self._batch is not None:
+                yield self
+                return
+            self._refresh()
+            self._batch = {"tasks": {}, "deletes": {}, "events": []}
             try:
-                raw = json.load(f)
-                if not isinstance(raw, list):
-                    raw = []
-            except json.JSONDecodeError:
-                raw = []
-            self.tasks = [self._from_dict(t) for t in raw if isinstance(t, dict)]
+                yield self
+            finally:
+                batch, self._batch = self._batch, None
+                if batch["tasks"] or batch["deletes"]:
+                    with metrics.span("task_store_commit"):
+                        self._store.commit(list(batch["tasks"].values()), list(batch["deletes"]), self._snapshot)
+                    self._record_changes([*batch["deletes"], *batch["tasks"]])
+                if batch["events"]:
+                    counts: Dict[str, int] = {}
+                    for name, _ in batch["events"]:
+                        counts[name] = counts.get(name, 0) + 1
+                    self._emit("tasks_batch", {"events": counts, "task_ids": list(batch["tasks"].keys())})
+
+    @_mutation
+    def archive_completed(self) -> int:
+        """Move done tasks older than TASKS_ARCHIVE_AFTER_DAYS to the archive; returns how many moved."""
+        return self._archive_completed()
+
+    def _maybe_archive(self):
+        if self._batch is None and time.monotonic() >= self._next_archive_check:
+            self._archive_completed()
 
-    def _save(self):
-        with open(self.file_path, "w", encoding="utf-8") as f:
-            json.dump([t.to_dict() for t in self.tasks], f, indent=2)
+    def _archive_completed(self) -> int:
+        self._next_archive_check = time.monotonic() + ARCHIVE_CHECK_SECONDS
+        if ARCHIVE_AFTER_DAYS <= 0:
+            return 0
+        cutoff = datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS)
+        bucket = self._by_status.get("done") or {}
+        old = [t for t in bucket.values() if (t._completed_dt or t._created_dt or datetime.min) < cutoff]
+        if not old:
+            return 0
+        old.sort(key=lambda t: self._seq[t.id])
+        # archive first: a crash before the delete below leaves a task in both tiers, never in neither
+        self._archive.append(old)
+        ids = [t.id for t in old]
+        for t in old:
+            self._unindex(t)
+            del self._by_id[t.id]
+            del self._seq[t.id]
+        gone = set(ids)
+        self.tasks = [t for t in self.tasks if t.id not in gone]
+        self._store.commit([], ids, self._snapshot)
+        self._record_changes(ids)
+        self._emit("tasks_archived", {"count": len(ids), "task_ids": ids})
+        return len(ids)
+
+    def iter_archived(self, since=None, until=None) -> Iterator[Dict]:
+        """
+        Stream archived tasks oldest first, optionally limited to completion
+        times in [since, until). Bad bounds raise ValueError here, before
+        anything is streamed.
+        """
+        return self._iter_archived(_parse_bound(since, "since"), _parse_bound(until, "until"))
+
+    def _iter_archived(self, lo: Optional[datetime], hi: Optional[datetime]) -> Iterator[Dict]:
+        for data in self._archive.iter():
+            if data.get("id") in self._by_id:
+                continue
+            if lo is not None or hi is not None:
+                done_at = _parse_iso(data.get("completed_at") or data.get("created_at"))
+                if done_at is None or (lo is not None and done_at < lo) or (hi is not None and done_at >= hi):
+                    continue
+            yield data
+
+    def _snapshot(self) -> List[Task]:
+        return list(self.tasks)
 
     def _from_dict(self, data: Dict) -> Task:
-        task = Task(
-            title=data["title"],
-            priority=data.get("priority", 3),
-            estimated_minutes=data.get("estimated_minutes", 60),
-            status=data.get("status", "pending"),
-            start=data.get("start"),
-            end=data.get("end"),
-            pending_time=data.get("pending_time", False),
-        )
-        task.id = data["id"]
-        task.created_at = data.get("created_at")
-        task.deduped = data.get("deduped", False)
-        return task
+        return Task.from_dict(data)
 
+    @_mutation
     def add_task(self, title: str, priority: int = 3, estimated_minutes: int = 60,
                  pending_time: bool = False) -> Task:
-       
-        DEDUP_WINDOW_SECONDS = int(os.environ.get("TASK_DEDUP_WINDOW_SECONDS", "120"))
-        now = datetime.utcnow()
-        norm = _normalize_title(title)
-
-        for t in self.tasks:
-            try:
-                created_at = datetime.fromisoformat(t.created_at) if isinstance(t.created_at, str) else None
-            except Exception:
-                created_at = None
-            if created_at:
-                age = (now - created_at).total_seconds()
-            else:
-                age = None
-   
-            if getattr(t, "_norm_title", _normalize_title(t.title)) == norm and t.pending_time == pending_time and (age is not None and age <= DEDUP_WINDOW_SECONDS):
-                try:
-                    emit_event("task_add_deduped", {"task_id": t.id, "title": title})
-                except Exception:
-                    pass
-                t.deduped = True
-                return t
+        dup_id = self._dedup.lookup((_normalize_title(title), pending_time), datetime.utcnow())
+        if dup_id is not None:
+            t = self._by_id[dup_id]
+            self._emit("task_add_deduped", {"task_id": t.id, "title": title})
+            t.deduped = True
+            return t
 
         task = Task(title=title, priority=priority, estimated_minutes=estimated_minutes, pending_time=pending_time)
         task.deduped = False
         self.tasks.append(task)
-        self._save()
-        try:
-            emit_event("task_added", {"task": task.to_dict()})
-        except Exception:
-            pass
+        self._index(task)
+        self._persist(task)
+        self._emit("task_added", {"task": task.to_dict()})
         return task
 
     def list_all(self) -> List[Dict]:
+        self._refresh()
         return [t.to_dict() for t in self.tasks]
 
     def list_by_status(self, status: str) -> List[Dict]:
-        return [t.to_dict() for t in self.tasks if t.status == status]
+        if hasattr(self._store, "list_by_status"):
+            return self._store.list_by_status(status)
+        self._refresh()
+        bucket = self._by_status.get(status) or {}
+        return [t.to_dict() for t in sorted(bucket.values(), key=lambda t: self._seq[t.id])]
+
+    def list_between(self, start, end, status: Optional[str] = None) -> List[Dict]:
+        """Tasks whose start falls in [start, end), ordered by start time."""
+        lo, hi = _parse_iso(start), _parse_iso(end)
+        if lo is None or hi is None:
+            raise ValueError("Invalid datetime format")
+        self._refresh()
+        i = bisect_left(self._by_start, (lo, ""))
+        j = bisect_left(self._by_start, (hi, ""))
+        out = []
+        for _, task_id in self._by_start[i:j]:
+            t = self._by_id[task_id]
+            if status is None or t.status == status:
+                out.append(t.to_dict())
+        return out
+
+    def _iter_tasks(self, status: Optional[str] = None, start_from=None, start_to=None,
+                    after: Optional[Tuple[datetime, str]] = None) -> Iterator[Task]:
+        lo, hi = _parse_bound(start_from, "start_from"), _parse_bound(start_to, "start_to")
+        self._refresh()
+        index = self._by_created
+        i = bisect_right(index, after) if after else 0
+        while i < len(index):
+            task = self._by_id.get(index[i][1])
+            i += 1
+            if task is None or (status is not None and task.status != status):
+                continue
+            if lo is not None or hi is not None:
+                start = task._start_dt
+                if start is None or (lo is not None and start < lo) or (hi is not None and start >= hi):
+                    continue
+            yield task
+
+    def iter_tasks(self, status: Optional[str] = None, start_from=None, start_to=None) -> Iterator[Dict]:
+        """Lazily yield task dicts in (created_at, id) order; start filters match [start_from, start_to)."""
+        for task in self._iter_tasks(status, start_from, start_to):
+            yield task.to_dict()
+
+    def page(self, limit: Optional[int] = None, cursor: Optional[str] = None, status: Optional[str] = None,
+             start_from=None, start_to=None, fields: Optional[Sequence[str]] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        One page of tasks in (created_at, id) order plus the cursor for the next
+        page (None on the last one). `fields` projects each task down to those
+        keys; "id" is always kept.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        keep = None
+        if fields:
+            keep = ["id"] + [f for f in fields if f != "id" and f in Task.FIELDS]
+        out: List[Dict] = []
+        last = None
+        for task in self._iter_tasks(status, start_from, start_to, after):
+            if limit is not None and len(out) >= limit:
+                return out, encode_cursor(*last.created_key())
+            d = task.to_dict()
+            out.append({k: d[k] for k in keep} if keep else d)
+            last = task
+        return out, None
+
+    def version_token(self) -> str:
+        self._refresh()
+        return f"{self._epoch}:{self.version}"
+
+    def changes_since(self, token: Optional[str]) -> Dict:
+        """
+        Tasks created, updated or removed after `token` (from version_token()).
+        Falls back to {"full": True, "tasks": <everything>} when the token is
+        from another epoch or older than the retained change log.
+        """
+        self._refresh()
+        epoch, _, raw = (token or "").partition(":")
+        since = int(raw) if raw.isdigit() else -1
+        current = f"{self._epoch}:{self.version}"
+        if epoch != self._epoch or since < 0 or since > self.version:
+            return {"version": current, "full": True, "tasks": self.list_all(), "removed": []}
+        if since == self.version:
+            return {"version": current, "full": False, "tasks": [], "removed": []}
+        # the oldest retained version may be partially evicted, so it can't serve as a base
+        if not self._changes or since < self._changes[0][0]:
+            return {"version": current, "full": True, "tasks": self.list_all(), "removed": []}
+        ids: Dict[str, None] = {}
+        for version, task_id in reversed(self._changes):
+            if version <= since:
+                break
+            ids.setdefault(task_id)
+        tasks, removed = [], []
+        for task_id in ids:
+            task = self._by_id.get(task_id)
+            if task is None:
+                removed.append(task_id)
+            else:
+                tasks.append(task.to_dict())
+        return {"version": current, "full": False, "tasks": tasks, "removed": removed}
+
+    def count_by_status(self) -> Dict[str, int]:
+        if hasattr(self._store, "count_by_status"):
+            return self._store.count_by_status()
+        self._refresh()
+        return {status: len(bucket) for status, bucket in self._by_status.items() if bucket}
+
+    def list_open(self) -> List[Dict]:
+        """Tasks that are not done, in creation order."""
+        self._refresh()
+        open_tasks = [t for status, bucket in self._by_status.items() if status != "done" for t in bucket.values()]
+        open_tasks.sort(key=lambda t: self._seq[t.id])
+        return [t.to_dict() for t in open_tasks]
+
+    def open_effort(self) -> Tuple[int, int]:
+        """(total estimated minutes, task count) over tasks that are not done."""
+        if hasattr(self._store, "open_effort"):
+            return self._store.open_effort()
+        self._refresh()
+        return self._open_minutes, len(self._open_by_priority)
+
+    def top_open(self, limit: int = 5) -> List[Dict]:
+        """Highest-priority tasks that are not done, ties kept in creation order."""
+        if hasattr(self._store, "top_open"):
+            return self._store.top_open(limit)
+        self._refresh()
+        return [self._by_id[task_id].to_dict() for _, _, task_id in self._open_by_priority[:limit]]
 
     def get_task(self, task_id: str) -> Optional[Task]:
-        return next((t for t in self.tasks if t.id == task_id), None)
+        self._refresh()
+        return self._by_id.get(task_id)
 
+    @_mutation
     def schedule_task(self, task_id, start, end):
         if hasattr(start, "isoformat"):
             start = start.isoformat()
@@ -136,36 +630,133 @@ class TaskMemory:
         if not task:
             raise ValueError("Task not found")
 
+        self._unindex(task)
         task.start = start
         task.end = end
         task.status = "scheduled"
         task.pending_time = False
-        self._save()
-        try:
-            emit_event("task_scheduled", {"task_id": task_id, "start": start, "end": end, "task": task.to_dict()})
-        except Exception:
-            pass
+        self._index(task)
+        self._persist(task)
+        self._emit("task_scheduled", {"task_id": task_id, "start": start, "end": end, "task": task.to_dict()})
 
+    @_mutation
     def complete_task(self, task_id: str):
         task = self.get_task(task_id)
         if not task:
             raise ValueError("Task not found")
+        self._unindex(task)
+        # completing again keeps the original time, which is what archiving ages tasks by
+        if task.status != "done" or not task.completed_at:
+            task.completed_at = datetime.utcnow().isoformat()
         task.status = "done"
-        self._save()
-        try:
-            emit_event("task_completed", {"task_id": task_id, "task": task.to_dict()})
-        except Exception:
-            pass
+        self._index(task)
+        self._persist(task)
+        self._emit("task_completed", {"task_id": task_id, "task": task.to_dict()})
 
+    @_mutation
     def update_task(self, task_id: str, updates: Dict):
         task = self.get_task(task_id)
         if not task:
             raise ValueError("Task not found")
+        new_id = updates.get("id", task_id)
+        if new_id != task_id and (not isinstance(new_id, str) or not new_id or new_id in self._by_id):
+            raise ValueError("Invalid or duplicate task id")
+        self._unindex(task)
         for key, value in updates.items():
-            if hasattr(task, key):
+            if key in Task.FIELDS:
                 setattr(task, key, value)
-        self._save()
+        if task.status == "done" and not task.completed_at:
+            task.completed_at = datetime.utcnow().isoformat()
+        renamed = ()
+        if task.id != task_id:
+            # the store and the change log must forget the old id, or a reload finds the task twice
+            self._by_id.pop(task_id, None)
+            self._seq[task.id] = self._seq.pop(task_id)
+            renamed = (task_id,)
+        self._index(task)
+        self._persist(task, renamed)
+        self._emit("task_updated", {"task_id": task_id, "updates": updates, "task": task.to_dict()})
+
+class TaskMemoryManager:
+    """
+    Lazily loaded per-user TaskMemory shards, one storage file per user.
+    Shards idle for longer than `idle_seconds` are dropped, and least recently
+    used shards are evicted while the resident task count exceeds `budget_tasks`.
+    """
+
+    def __init__(self, shard_dir: str = SHARD_DIR, storage_mode: str = STORAGE_MODE,
+                 budget_tasks: int = SHARD_BUDGET_TASKS, idle_seconds: int = SHARD_IDLE_SECONDS,
+                 multiprocess: bool = MULTIPROCESS):
+        self.shard_dir = shard_dir
+        self.multiprocess = multiprocess
+        self.storage_mode = storage_mode
+        self.budget_tasks = budget_tasks
+        self.idle_seconds = idle_seconds
+        self._shards: "OrderedDict[str, Tuple[TaskMemory, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def shard_path(self, user_id: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", user_id)[:64]
+        digest = hashlib.sha1(user_id.encode("utf-8")).hexdigest()[:8]
+        return os.path.join(self.shard_dir, f"{safe}-{digest}.json")
+
+    def for_user(self, user_id: str) -> TaskMemory:
+        if not user_id:
+            raise ValueError("Missing user_id")
+        with self._lock:
+            now = time.monotonic()
+            entry = self._shards.pop(user_id, None)
+            if entry is None:
+                memory = self._open(user_id)
+            else:
+                memory = entry[0]
+            self._shards[user_id] = (memory, now)
+            self._evict(now)
+            return memory
+
+    def _open(self, user_id: str) -> TaskMemory:
+        path = self.shard_path(user_id)
+        if user_id == LEGACY_OWNER and not os.path.exists(path) and os.path.exists(DATA_FILE):
+            os.makedirs(self.shard_dir, exist_ok=True)
+            shutil.copyfile(DATA_FILE, path)
+        return TaskMemory(path, self.storage_mode, user_id=user_id, multiprocess=self.multiprocess)
+
+    def _evict(self, now: float):
+        for user_id, (memory, last_used) in list(self._shards.items()):
+            if now - last_used > self.idle_seconds:
+                self._drop(user_id)
+        resident = sum(len(m.tasks) for m, _ in self._shards.values())
+        for user_id, (memory, last_used) in list(self._shards.items()):
+            if resident <= self.budget_tasks:
+                break
+            if now - last_used < SHARD_GRACE_SECONDS:
+                continue
+            resident -= len(memory.tasks)
+            self._drop(user_id)
+
+    def _drop(self, user_id: str):
+        memory, _ = self._shards.pop(user_id)
+        try:
+            memory.close()
+        except Exception:
+            pass
         try:
-            emit_event("task_updated", {"task_id": task_id, "updates": updates, "task": task.to_dict()})
+            emit_event("task_shard_evicted", {"user": user_id, "tasks": len(memory.tasks)})
         except Exception:
-            pass
\ No newline at end of file
+            pass
+
+    def resident_users(self) -> List[str]:
+        with self._lock:
+            return list(self._shards.keys())
+
+    def close(self):
+        with self._lock:
+            for user_id in list(self._shards.keys()):
+                self._drop(user_id)
+
+
+def resolve_memory(memory, user_id: str):
+    """Return the caller's shard when given a TaskMemoryManager, else `memory` unchanged."""
+    if isinstance(memory, TaskMemoryManager):
+        return memory.for_user(user_id)
+    return memory
@@ -0,0 +1,704 @@
+import atexit
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, LockedTaskStore only serializes threads
+    fcntl = None
+
+logger = logging.getLogger("task_store")
+
+JOURNAL_COMPACT_EVERY = int(os.environ.get("TASKS_JOURNAL_COMPACT_EVERY", "1000"))
+SQLITE_FILE = os.environ.get("TASKS_SQLITE_FILE", "data/tasks.db")
+# group commit: 0 disables; otherwise flush at most every N ms or after MAX queued mutations
+GROUP_COMMIT_MS = int(os.environ.get("TASKS_GROUP_COMMIT_MS", "0"))
+GROUP_COMMIT_MAX = int(os.environ.get("TASKS_GROUP_COMMIT_MAX", "100"))
+# failed group commits are retried with exponential backoff up to this many seconds apart;
+# once the store is closing they are given up (and logged) after CLOSE_RETRIES attempts
+GROUP_COMMIT_MAX_BACKOFF = float(os.environ.get("TASKS_GROUP_COMMIT_MAX_BACKOFF", "5"))
+GROUP_COMMIT_CLOSE_RETRIES = int(os.environ.get("TASKS_GROUP_COMMIT_CLOSE_RETRIES", "3"))
+# how long flush() (and so close()) waits for the writer
+GROUP_COMMIT_FLUSH_TIMEOUT = float(os.environ.get("TASKS_GROUP_COMMIT_FLUSH_TIMEOUT", "10"))
+
+
+def _ensure_dir(path: str):
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+
+
+def _read_snapshot(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            raw = json.load(f)
+        except json.JSONDecodeError:
+            raw = []
+    if not isinstance(raw, list):
+        raw = []
+    return [t for t in raw if isinstance(t, dict)]
+
+
+def _write_atomic(path: str, tasks: List, indent=None):
+    # unique temp name: several processes may write snapshots of the same file
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            if indent:
+                json.dump([t.to_dict() for t in tasks], f, indent=indent)
+            else:
+                f.write("[" + ",".join(t.to_json() for t in tasks) + "]")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class JsonTaskStore:
+    """
+    Whole-file JSON array; every commit rewrites the file.
+
+    Stores load plain dicts and persist task objects exposing `id`, `to_dict()`
+    and `to_json()`.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    def load(self) -> List[Dict]:
+        if not os.path.exists(self.file_path):
+            self.ensure_file()
+            return []
+        return _read_snapshot(self.file_path)
+
+    def ensure_file(self):
+        """Create an empty task file if there is none (LockedTaskStore calls this under its write lock)."""
+        _ensure_dir(self.file_path)
+        if not os.path.exists(self.file_path):
+            self.compact([])
+
+    def commit(self, upserts: List, deletes: List[str], snapshot: Callable[[], List]):
+        self.compact(snapshot())
+
+    def compact(self, tasks: List):
+        _write_atomic(self.file_path, tasks, indent=2)
+
+    def close(self):
+        pass
+
+
+class JournalTaskStore:
+    """
+    Snapshot + append-only journal. The snapshot keeps the tasks.json format;
+    mutations are appended to `<file>.journal` as one JSON record per line and
+    folded back into the snapshot (atomic rename) every `compact_every` records.
+    """
+
+    def __init__(self, file_path: str, compact_every: int = JOURNAL_COMPACT_EVERY):
+        self.file_path = file_path
+        self.journal_path = f"{file_path}.journal"
+        self.compact_every = max(1, compact_every)
+        self._records = 0
+        self._fh = None
+
+    def load(self) -> List[Dict]:
+        _ensure_dir(self.file_path)
+        tasks: Dict[str, Dict] = {}
+        if os.path.exists(self.file_path):
+            for t in _read_snapshot(self.file_path):
+                if "id" in t:
+                    tasks[t["id"]] = t
+        self._records = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        # torn tail from a crash mid-append; everything before it is intact
+                        logger.warning("Ignoring unreadable journal record in %s", self.journal_path)
+                        continue
+                    self._apply(tasks, rec)
+                    self._records += 1
+        return list(tasks.values())
+
+    @staticmethod
+    def _apply(tasks: Dict[str, Dict], rec: Dict):
+        op = rec.get("op")
+        if op == "put" and isinstance(rec.get("task"), dict):
+            task = rec["task"]
+            tasks[task["id"]] = task
+        elif op == "del":
+            tasks.pop(rec.get("id"), None)
+
+    def _journal(self):
+        if self._fh is None:
+            self._fh = open(self.journal_path, "a", encoding="utf-8")
+        return self._fh
+
+    def commit(self, upserts: List, deletes: List[str], snapshot: Callable[[], List]):
+        lines = ['{"op":"put","task":' + t.to_json() + "}" for t in upserts]
+        lines.extend(json.dumps({"op": "del", "id": tid}) for tid in deletes)
+        if not lines:
+            return
+        fh = self._journal()
+        fh.write("\n".join(lines) + "\n")
+        fh.flush()
+        self._records += len(lines)
+        if self._records >= self.compact_every:
+            self.compact(snapshot())
+
+    def compact(self, tasks: List):
+        _write_atomic(self.file_path, tasks)
+        # a crash between the rename and the truncate only means the journal is
+        # replayed over a snapshot that already contains it, which is idempotent
+        self.close()
+        with open(self.journal_path, "w", encoding="utf-8"):
+            pass
+        self._records = 0
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+class TaskArchive:
+    """
+    Cold tier for completed tasks: `<file>.archive.jsonl.gz`, one JSON task per
+    line. Each append is written as its own gzip member, so the file is only
+    ever appended to; iter() streams it back without loading it whole.
+    """
+
+    def __init__(self, file_path: str):
+        self.path = f"{file_path}.archive.jsonl.gz"
+
+    def append(self, tasks: List):
+        if not tasks:
+            return
+        _ensure_dir(self.path)
+        data = ("\n".join(t.to_json() for t in tasks) + "\n").encode("utf-8")
+        with open(self.path, "ab") as f:
+            f.write(gzip.compress(data))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def iter(self) -> Iterator[Dict]:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(rec, dict):
+                        yield rec
+        except (EOFError, OSError, zlib.error):
+            # torn final member from a crash mid-append; earlier members are intact
+            logger.warning("Archive %s ends with an unreadable member", self.path)
+
+
+class LockedTaskStore:
+    """
+    Makes a file store safe to share between worker processes.
+
+    Writers hold an exclusive flock on `<file>.lock` from the staleness check
+    through the commit, and bump the integer in `<file>.version` afterwards.
+    Readers compare that version with the one they loaded (`changed()`) and
+    reload under a shared lock when another process has written.
+    """
+
+    def __init__(self, inner, file_path: str):
+        self.inner = inner
+        self.lock_path = f"{file_path}.lock"
+        self.version_path = f"{file_path}.version"
+        self.version = 0
+        self._mutex = threading.RLock()
+        self._depth = 0
+        self._lock_fh = None
+        if fcntl is None:
+            logger.warning("fcntl unavailable; TaskMemory is only safe within a single process.")
+
+    def _flock(self, mode):
+        if fcntl is None:
+            return
+        if self._lock_fh is None:
+            _ensure_dir(self.lock_path)
+            self._lock_fh = open(self.lock_path, "a+")
+        fcntl.flock(self._lock_fh.fileno(), mode)
+
+    def _unlock(self):
+        if fcntl is not None and self._lock_fh is not None:
+            fcntl.flock(self._lock_fh.fileno(), fcntl.LOCK_UN)
+
+    @contextmanager
+    def write_lock(self):
+        with self._mutex:
+            if self._depth == 0:
+                self._flock(fcntl.LOCK_EX if fcntl else None)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._unlock()
+
+    def _read_version(self) -> int:
+        try:
+            with open(self.version_path, "r", encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _bump_version(self):
+        self.version = self._read_version() + 1
+        tmp = f"{self.version_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(str(self.version))
+        os.replace(tmp, self.version_path)
+
+    def changed(self) -> bool:
+        return self._read_version() != self.version
+
+    def load(self) -> List[Dict]:
+        ensure_file = getattr(self.inner, "ensure_file", None)
+        if ensure_file is not None and not os.path.exists(self.inner.file_path):
+            # creating the file is a write: never do it under the shared lock
+            with self.write_lock():
+                ensure_file()
+        with self._mutex:
+            shared = self._depth == 0
+            if shared:
+                self._flock(fcntl.LOCK_SH if fcntl else None)
+            try:
+                tasks = self.inner.load()
+                self.version = self._read_version()
+            finally:
+                if shared:
+                    self._unlock()
+        return tasks
+
+    def commit(self, upserts: List, deletes: List[str], snapshot: Callable[[], List]):
+        with self.write_lock():
+            self.inner.commit(upserts, deletes, snapshot)
+            self._bump_version()
+
+    def compact(self, tasks: List):
+        with self.write_lock():
+            self.inner.compact(tasks)
+            self._bump_version()
+
+    def close(self):
+        self.inner.close()
+        if self._lock_fh is not None:
+            self._lock_fh.close()
+            self._lock_fh = None
+
+
+class GroupCommitStore:
+    """
+    Defers commits to a background writer thread. Mutations only record which
+    tasks are dirty; the writer hands them to the inner store in one commit at
+    most every `interval_ms`, or sooner once `max_pending` mutations queue up.
+    flush() writes immediately; wait_durable() blocks until everything
+    committed so far has reached the inner store.
+
+    Pushdown queries are deliberately not forwarded: until a flush the inner
+    store lags memory, so TaskMemory answers from its own indexes instead.
+    """
+
+    def __init__(self, inner, interval_ms: int = GROUP_COMMIT_MS, max_pending: int = GROUP_COMMIT_MAX):
+        self.inner = inner
+        self.interval = max(interval_ms, 1) / 1000.0
+        self.max_pending = max(1, max_pending)
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._upserts: Dict[str, object] = {}
+        self._deletes = set()
+        self._snapshot: Optional[Callable[[], List]] = None
+        self._pending = 0
+        self._first_dirty = None
+        self._submitted = 0
+        self._durable = 0
+        self._failures = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="tasks-group-commit", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def load(self) -> List[Dict]:
+        return self.inner.load()
+
+    def commit(self, upserts: List, deletes: List[str], snapshot: Callable[[], List]):
+        with self._cond:
+            for t in upserts:
+                self._upserts[t.id] = t
+                self._deletes.discard(t.id)
+            for task_id in deletes:
+                self._upserts.pop(task_id, None)
+                self._deletes.add(task_id)
+            self._snapshot = snapshot
+            self._pending += 1
+            self._submitted += 1
+            if self._first_dirty is None:
+                self._first_dirty = time.monotonic()
+            self._cond.notify_all()
+
+    def _take(self):
+        batch = (list(self._upserts.values()), list(self._deletes), self._snapshot, self._submitted)
+        self._upserts, self._deletes = {}, set()
+        self._pending = 0
+        self._first_dirty = None
+        return batch
+
+    def _requeue(self, batch):
+        """Put a failed batch back; ids changed again since it was taken keep their newer state."""
+        upserts, deletes, snapshot, _ = batch
+        with self._cond:
+            for t in upserts:
+                if t.id not in self._upserts and t.id not in self._deletes:
+                    self._upserts[t.id] = t
+            for task_id in deletes:
+                if task_id not in self._upserts:
+                    self._deletes.add(task_id)
+            if self._snapshot is None:
+                self._snapshot = snapshot
+            # already counted in _submitted: the next successful write covers it
+            self._pending += 1
+            if self._first_dirty is None:
+                self._first_dirty = time.monotonic()
+
+    def _write_pending(self):
+        # taking, writing and requeueing under one lock keeps batches in order: a newer batch can't
+        # land before a failed older one is merged back
+        with self._io_lock:
+            with self._cond:
+                if not self._pending:
+                    return
+                batch = self._take()
+            upserts, deletes, snapshot, seq = batch
+            try:
+                self.inner.commit(upserts, deletes, snapshot)
+            except Exception:
+                with self._cond:
+                    self._failures += 1
+                    give_up = self._closed and self._failures >= GROUP_COMMIT_CLOSE_RETRIES
+                if give_up:
+                    logger.exception("Group commit failed %d times while closing; dropping %d upserts %s and %d deletes %s",
+                                     self._failures, len(upserts), [t.id for t in upserts], len(deletes), deletes)
+                    return
+                logger.exception("Group commit failed; keeping %d changes queued", len(upserts) + len(deletes))
+                self._requeue(batch)
+                return
+            with self._cond:
+                self._failures = 0
+                self._durable = max(self._durable, seq)
+                self._cond.notify_all()
+
+    def _backoff(self) -> float:
+        return min(self.interval * 2 ** self._failures, GROUP_COMMIT_MAX_BACKOFF) if self._failures else 0.0
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and self._pending == 0:
+                    self._cond.wait()
+                if self._pending == 0:
+                    return
+                while not self._closed and self._pending < self.max_pending:
+                    remaining = self._first_dirty + self.interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                delay = self._backoff()
+            if delay:
+                time.sleep(delay)
+            self._write_pending()
+
+    def flush(self, timeout: Optional[float] = GROUP_COMMIT_FLUSH_TIMEOUT) -> bool:
+        """Write pending changes now; False if they aren't durable within `timeout` seconds."""
+        self._write_pending()
+        if not self.wait_durable(timeout):
+            logger.warning("Group commit flush timed out after %ss", timeout)
+            return False
+        return True
+
+    def wait_durable(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            target = self._submitted
+            return self._cond.wait_for(lambda: self._durable >= target, timeout)
+
+    def compact(self, tasks: List):
+        self.flush()
+        with self._io_lock:
+            self.inner.compact(tasks)
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        # the writer drains the queue before exiting, retrying failed commits a bounded number of times
+        self._thread.join()
+        if self._pending:
+            self.flush()
+        self._snapshot = None
+        atexit.unregister(self.close)
+        self.inner.close()
+
+
+def _as_int(value, default: int) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class SqliteTaskStore:
+    """
+    Tasks in a shared SQLite database (WAL mode), partitioned by user_id.
+    Each row keeps the full task dict in `data` plus the columns the
+    pushdown queries below filter and aggregate on.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            user_id TEXT NOT NULL,
+            id TEXT NOT NULL,
+            status TEXT,
+            priority INTEGER,
+            estimated_minutes INTEGER,
+            created_at TEXT,
+            start TEXT,
+            data TEXT NOT NULL,
+            PRIMARY KEY (user_id, id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_tasks_user_status ON tasks (user_id, status);
+        CREATE INDEX IF NOT EXISTS idx_tasks_user_created ON tasks (user_id, created_at);
+        CREATE INDEX IF NOT EXISTS idx_tasks_user_start ON tasks (user_id, start);
+        CREATE TABLE IF NOT EXISTS migrations (
+            user_id TEXT NOT NULL,
+            source TEXT NOT NULL,
+            PRIMARY KEY (user_id, source)
+        );
+        CREATE TABLE IF NOT EXISTS user_versions (
+            user_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        );
+    """
+
+    BUMP_VERSION = """
+        INSERT INTO user_versions (user_id, version) VALUES (?, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+    """
+
+    UPSERT = """
+        INSERT INTO tasks (user_id, id, status, priority, estimated_minutes, created_at, start, data)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, id) DO UPDATE SET
+            status = excluded.status, priority = excluded.priority,
+            estimated_minutes = excluded.estimated_minutes, created_at = excluded.created_at,
+            start = excluded.start, data = excluded.data
+    """
+
+    def __init__(self, db_path: str = SQLITE_FILE, user_id: str = "", legacy_json: Optional[str] = None):
+        self.db_path = db_path
+        self.user_id = user_id or ""
+        self.legacy_json = legacy_json
+        self._lock = threading.RLock()
+        self._write_depth = 0
+        _ensure_dir(db_path)
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._data_version = None
+
+    def _row(self, t: Dict, data: Optional[str] = None):
+        return (self.user_id, t["id"], t.get("status"), _as_int(t.get("priority"), 3),
+                _as_int(t.get("estimated_minutes"), 60), t.get("created_at"), t.get("start"),
+                data or json.dumps(t, separators=(",", ":")))
+
+    def _task_row(self, task):
+        return self._row(task.to_dict(), task.to_json())
+
+    def _select_all(self) -> List[Dict]:
+        # version first: a commit landing in between only causes one extra reload later
+        self._data_version = self._version()
+        rows = self._conn.execute(
+            "SELECT data FROM tasks WHERE user_id = ? ORDER BY rowid", (self.user_id,)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def _import_legacy(self):
+        source = os.path.abspath(self.legacy_json)
+        done = self._conn.execute(
+            "SELECT 1 FROM migrations WHERE user_id = ? AND source = ?", (self.user_id, source)).fetchone()
+        if done or not os.path.exists(source):
+            return
+        imported = [t for t in _read_snapshot(source) if "id" in t]
+        with self._transaction():
+            self._conn.executemany(self.UPSERT, [self._row(t) for t in imported])
+            self._conn.execute("INSERT INTO migrations (user_id, source) VALUES (?, ?)", (self.user_id, source))
+            self._conn.execute(self.BUMP_VERSION, (self.user_id,))
+        logger.info("Imported %d tasks from %s into %s", len(imported), source, self.db_path)
+
+    def load(self) -> List[Dict]:
+        with self._lock:
+            if self.legacy_json:
+                self._import_legacy()
+            return self._select_all()
+
+    def _version(self) -> int:
+        # per user, so a commit to one user's partition doesn't make every other shard reload
+        row = self._conn.execute("SELECT version FROM user_versions WHERE user_id = ?", (self.user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def _bump_version(self):
+        """Call inside the write transaction; our own commits don't make this store stale."""
+        before = self._version()
+        self._conn.execute(self.BUMP_VERSION, (self.user_id,))
+        if before == self._data_version:
+            self._data_version = before + 1
+
+    @contextmanager
+    def write_lock(self):
+        # BEGIN IMMEDIATE takes SQLite's write lock up front, so the staleness
+        # check and the commit that follows can't interleave with another worker
+        with self._lock:
+            if not self._conn.in_transaction:
+                self._conn.execute("BEGIN IMMEDIATE")
+            self._write_depth += 1
+            try:
+                yield
+            finally:
+                self._write_depth -= 1
+                if self._write_depth == 0 and self._conn.in_transaction:
+                    self._conn.commit()
+
+    @contextmanager
+    def _transaction(self):
+        """Commit on exit, unless inside write_lock(): then its transaction commits when the lock is released."""
+        with self._lock:
+            if self._write_depth:
+                yield
+            else:
+                with self._conn:
+                    yield
+
+    def changed(self) -> bool:
+        """True when another connection (e.g. another worker) committed to this user since our last load."""
+        with self._lock:
+            return self._data_version is not None and self._version() != self._data_version
+
+    def commit(self, upserts: List, deletes: List[str], snapshot: Callable[[], List]):
+        with self._transaction():
+            if upserts:
+                self._conn.executemany(self.UPSERT, [self._task_row(t) for t in upserts])
+            if deletes:
+                self._conn.executemany("DELETE FROM tasks WHERE user_id = ? AND id = ?",
+                                       [(self.user_id, tid) for tid in deletes])
+            if upserts or deletes:
+                self._bump_version()
+
+    def compact(self, tasks: List):
+        with self._transaction():
+            self._conn.execute("DELETE FROM tasks WHERE user_id = ?", (self.user_id,))
+            self._conn.executemany(self.UPSERT, [self._task_row(t) for t in tasks])
+            self._bump_version()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # pushdown queries used by TaskMemory instead of scanning Python objects
+
+    def count_by_status(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM tasks WHERE user_id = ? GROUP BY status", (self.user_id,)).fetchall()
+        return {status: n for status, n in rows}
+
+    def open_effort(self):
+        with self._lock:
+            total, count = self._conn.execute(
+                "SELECT COALESCE(SUM(estimated_minutes), 0), COUNT(*) FROM tasks "
+                "WHERE user_id = ? AND status != 'done'", (self.user_id,)).fetchone()
+        return total, count
+
+    def top_open(self, limit: int) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM tasks WHERE user_id = ? AND status != 'done' "
+                "ORDER BY priority, rowid LIMIT ?", (self.user_id, limit)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def list_by_status(self, status: str) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM tasks WHERE user_id = ? AND status = ? ORDER BY rowid",
+                (self.user_id, status)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+
+def migrate_json_to_sqlite(json_path: str, db_path: str = SQLITE_FILE, user_id: str = "") -> int:
+    """Copy a tasks.json array into the SQLite store under `user_id`; returns the number of tasks."""
+    tasks = [t for t in _read_snapshot(json_path) if "id" in t]
+    store = SqliteTaskStore(db_path, user_id)
+    try:
+        with store._conn:
+            store._conn.executemany(store.UPSERT, [store._row(t) for t in tasks])
+            store._conn.execute(store.BUMP_VERSION, (user_id,))
+    finally:
+        store.close()
+    return len(tasks)
+
+
+def make_store(file_path: str, mode: str = "json", user_id: str = "", multiprocess: bool = False,
+               group_commit_ms: int = GROUP_COMMIT_MS):
+    mode = (mode or "json").lower()
+    if mode == "sqlite":
+        # SQLite does its own cross-process locking
+        store = SqliteTaskStore(SQLITE_FILE, user_id, legacy_json=file_path)
+    elif mode == "journal":
+        store = JournalTaskStore(file_path)
+    else:
+        if mode != "json":
+            logger.warning("Unknown TASKS_STORAGE %r; using json.", mode)
+        store = JsonTaskStore(file_path)
+    if multiprocess:
+        if group_commit_ms:
+            # other workers must see a write before the lock is released
+            logger.warning("TASKS_GROUP_COMMIT_MS is ignored in multi-process mode.")
+        return store if mode == "sqlite" else LockedTaskStore(store, file_path)
+    if group_commit_ms:
+        return GroupCommitStore(store, group_commit_ms)
+    return store
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Migrate a tasks.json file into the SQLite task store.")
+    ap.add_argument("json_path")
+    ap.add_argument("--db", default=SQLITE_FILE)
+    ap.add_argument("--user", default="", help="user partition to import into (empty for unsharded)")
+    args = ap.parse_args()
+    print(f"Migrated {migrate_json_to_sqlite(args.json_path, args.db, args.user)} tasks into {args.db}")
@@ -0,0 +1,232 @@
+"""
+Tokenizer and grammar for the relative times people type when asked
+"when should I schedule it?": "tomorrow 3pm", "next mon 9:30", "in 2 hours",
+"today evening", "tmrw at noon". Misspelled day words ("tommorow",
+"wendesday") are matched against a small lexicon by edit distance.
+
+parse() returns None for anything outside the grammar (month names, dates,
+bare or spelled-out ambiguous numbers, unknown words); callers fall back to
+dateutil.
+"""
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+# time used when only a day is given; matches tools.parse_time's historical default
+DEFAULT_HOUR = 11
+PERIODS = {"morning": 9, "afternoon": 14, "evening": 18, "night": 20, "tonight": 20, "noon": 12}
+
+_WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+_UNITS = {"minute": 1, "hour": 60, "day": 1440, "week": 10080}
+
+# exact spellings (abbreviations included) -> canonical word
+_LEXICON = {
+    "today": "today", "tdy": "today", "tonight": "tonight", "tonite": "tonight",
+    "tomorrow": "tomorrow", "tmrw": "tomorrow", "tmr": "tomorrow", "tmw": "tomorrow", "tmrow": "tomorrow",
+    "2morrow": "tomorrow", "2moro": "tomorrow",
+    "next": "next", "this": "this", "coming": "next", "in": "in", "a": "a", "an": "a", "after": "after", "day": "day",
+    "am": "am", "pm": "pm", "morning": "morning", "afternoon": "afternoon", "evening": "evening", "night": "night",
+    "noon": "noon", "midday": "noon",
+    "minute": "minute", "minutes": "minute", "min": "minute", "mins": "minute",
+    "hour": "hour", "hours": "hour", "hr": "hour", "hrs": "hour", "h": "hour",
+    "days": "day", "week": "week", "weeks": "week", "wk": "week", "wks": "week",
+    "mon": "monday", "tue": "tuesday", "tues": "tuesday", "wed": "wednesday", "weds": "wednesday",
+    "thu": "thursday", "thur": "thursday", "thurs": "thursday", "fri": "friday", "sat": "saturday", "sun": "sunday",
+}
+_LEXICON.update({d: d for d in _WEEKDAYS})
+# words that carry no meaning here
+_FILLERS = frozenset(("at", "on", "by", "around", "about", "the", "for", "please", "pls", "o'clock", "oclock"))
+# spelled-out numbers are ambiguous like bare digits ("tomorrow at eight"), and must never be
+# "corrected" into a lexicon word ("eight" is one edit from "night")
+_NUMBER_WORDS = frozenset((
+    "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten", "eleven", "twelve",
+    "half", "quarter", "thirty", "fifteen", "fortyfive",
+))
+# only full day words are candidates for typo correction: short abbreviations are too easy to
+# hit by accident, and period words collide with ordinary ones ("might" -> "night")
+_FUZZY_TARGETS = tuple(w for w in _LEXICON
+                       if len(w) >= 5 and w.isalpha() and _LEXICON[w] == w and w not in PERIODS)
+
+_TOKEN_RE = re.compile(r"\d{1,2}:\d{2}|\d+|[a-z]+(?:'[a-z]+)?|\S")
+_IGNORED_PUNCT = frozenset(",.!;")
+
+
+def _distance(a: str, b: str, limit: int) -> int:
+    """Damerau-Levenshtein (optimal string alignment) distance, or limit + 1 once it is exceeded."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+@lru_cache(maxsize=4096)
+def correct(word: str) -> Optional[str]:
+    """Canonical form of a word: exact lexicon match, or the single closest full word within 1-2 edits."""
+    if word in _LEXICON:
+        return _LEXICON[word]
+    if len(word) < 4 or not word.isalpha() or word in _NUMBER_WORDS:
+        return None
+    limit = 1 if len(word) <= 5 else 2
+    best, best_d, tie = None, limit + 1, False
+    for target in _FUZZY_TARGETS:
+        d = _distance(word, target, limit)
+        if d < best_d:
+            best, best_d, tie = target, d, False
+        elif d == best_d:
+            tie = True
+    if best is None or tie:
+        return None
+    return _LEXICON[best]
+
+
+def tokenize(text: str) -> Optional[List[str]]:
+    """Canonical tokens, or None if the text contains something the grammar doesn't know."""
+    text = text.lower().replace("a.m.", "am").replace("p.m.", "pm").replace("@", " at ")
+    out = []
+    for tok in _TOKEN_RE.findall(text):
+        if tok[0].isdigit():
+            out.append(tok)
+        elif tok in _FILLERS:
+            continue
+        elif not tok[0].isalpha():
+            if tok not in _IGNORED_PUNCT:
+                return None
+        else:
+            word = correct(tok)
+            if word is None:
+                return None
+            out.append(word)
+    return out
+
+
+def _clock(tokens: List[str], i: int) -> Tuple[Optional[Tuple[int, int, Optional[str], bool]], int]:
+    """Parse H, H:MM, H am/pm at tokens[i] -> ((hour, minute, meridiem, had_colon), next index)."""
+    tok = tokens[i]
+    if ":" in tok:
+        h, m = tok.split(":")
+        hour, minute, colon = int(h), int(m), True
+    elif len(tok) <= 2:
+        hour, minute, colon = int(tok), 0, False
+    else:
+        return None, i
+    i += 1
+    meridiem = None
+    if i < len(tokens) and tokens[i] in ("am", "pm"):
+        meridiem = tokens[i]
+        i += 1
+    if minute > 59 or hour > 23 or (meridiem and not 1 <= hour <= 12):
+        return None, i
+    return (hour, minute, meridiem, colon), i
+
+
+def parse(text: str, now: datetime) -> Optional[datetime]:
+    tokens = tokenize(text)
+    if not tokens:
+        return None
+    day_offset = weekday = period = clock = delta = None
+    next_week = False
+    i, n = 0, len(tokens)
+    while i < n:
+        tok = tokens[i]
+        if tok in ("today", "tonight", "tomorrow"):
+            if day_offset is not None or weekday is not None:
+                return None
+            day_offset = 1 if tok == "tomorrow" else 0
+            if tok == "tonight":
+                period = "tonight"
+            i += 1
+        elif tok == "day" and tokens[i + 1:i + 3] == ["after", "tomorrow"]:
+            if day_offset is not None or weekday is not None:
+                return None
+            day_offset = 2
+            i += 3
+        elif tok in ("next", "this") and i + 1 < n and tokens[i + 1] in _WEEKDAYS:
+            if day_offset is not None or weekday is not None:
+                return None
+            weekday = _WEEKDAYS.index(tokens[i + 1])
+            next_week = tok == "next"
+            i += 2
+        elif tok in _WEEKDAYS:
+            if day_offset is not None or weekday is not None:
+                return None
+            weekday = _WEEKDAYS.index(tok)
+            i += 1
+        elif tok in PERIODS:
+            if period is not None and period != "tonight":
+                return None
+            period = tok
+            i += 1
+        elif tok == "this" and i + 1 < n and tokens[i + 1] in PERIODS:
+            # "this evening"
+            if weekday is not None or day_offset not in (None, 0):
+                return None
+            day_offset = 0
+            i += 1
+        elif tok == "in":
+            # "in 2 hours", "in an hour", "in 30 min"
+            if delta is not None or i + 2 >= n or tokens[i + 2] not in _UNITS:
+                return None
+            amount = tokens[i + 1]
+            if amount == "a":
+                amount = 1
+            elif amount.isdigit():
+                amount = int(amount)
+            else:
+                return None
+            delta = timedelta(minutes=amount * _UNITS[tokens[i + 2]])
+            i += 3
+        elif tok[0].isdigit():
+            if clock is not None:
+                return None
+            clock, i = _clock(tokens, i)
+            if clock is None:
+                return None
+        else:
+            return None
+
+    if delta is not None:
+        if day_offset is not None or weekday is not None or period is not None or clock is not None:
+            return None
+        return (now + delta).replace(second=0, microsecond=0)
+
+    if weekday is not None:
+        ahead = (weekday - now.weekday()) % 7
+        # a bare weekday may be today (as dateutil reads it); "next <weekday>" never is
+        if next_week and ahead == 0:
+            ahead = 7
+        day = now + timedelta(days=ahead)
+    else:
+        day = now + timedelta(days=day_offset or 0)
+
+    if clock is not None:
+        hour, minute, meridiem, colon = clock
+        if meridiem is None and period in ("afternoon", "evening", "night", "tonight") and hour < 12:
+            meridiem = "pm"
+        elif meridiem is None and period == "morning":
+            meridiem = "am"
+        if meridiem is None and not colon:
+            # "tomorrow 3" could be 3am or 3pm (dateutil would even read it as the 3rd)
+            return None
+        if meridiem == "pm" and hour != 12:
+            hour += 12
+        elif meridiem == "am" and hour == 12:
+            hour = 0
+    elif period is not None:
+        hour, minute = PERIODS[period], 0
+    elif day_offset is not None or weekday is not None:
+        hour, minute = DEFAULT_HOUR, 0
+    else:
+        return None
+    return day.replace(hour=hour, minute=minute, second=0, microsecond=0)
@@ -2,6 +2,8 @@
 from datetime import datetime, timedelta
 from dateutil import parser as dateparser
 import re
+from task_memory import resolve_memory
+import time_grammar
 
 def add_task(memory, title, est=None, priority=None):
     estimated = int(est) if est else 60
@@ -16,11 +18,15 @@ def list_tasks(memory, status=None):
     tasks = memory.list_all() if not status else memory.list_by_status(status)
     return {"tasks": tasks}
 
-def parse_time(text):
+def parse_time(text, now=None):
    
     if not text or not text.strip():
         return None
-    now = datetime.now()
+    now = now or datetime.now()
+    # common relative forms ("tomorrow 3pm", "in 2 hours", typos included); dateutil handles the rest
+    parsed = time_grammar.parse(text, now)
+    if parsed:
+        return {"start": parsed.isoformat(), "end": (parsed + timedelta(hours=1)).isoformat()}
     txt = text.strip().lower()
     txt = re.sub(r'\bon\b\s+on\b', ' on', txt)
     txt = re.sub(r'\s+', ' ', txt)
@@ -52,14 +58,18 @@ def parse_time(text):
 
 def summarize_tasks(memory, user_id, scope="all"):
 
-    tasks = memory.list_all()
-    if scope != "all":
-        tasks = [t for t in tasks if t.get("status") == scope]
-    total = len(tasks)
-    done = len([t for t in tasks if t.get("status") == "done"])
-    scheduled = len([t for t in tasks if t.get("status") == "scheduled"])
-    pending = len([t for t in tasks if t.get("status") not in ("done", "scheduled")])
-    top_pending = sorted([t for t in tasks if t.get("status") != "done"], key=lambda x: x.get("priority", 3))[:5]
+    memory = resolve_memory(memory, user_id)
+    if scope == "all":
+        counts = memory.count_by_status()
+        top_pending = memory.top_open(5)
+    else:
+        tasks = memory.list_by_status(scope)
+        counts = {scope: len(tasks)}
+        top_pending = [] if scope == "done" else sorted(tasks, key=lambda x: x.get("priority", 3))[:5]
+    total = sum(counts.values())
+    done = counts.get("done", 0)
+    scheduled = counts.get("scheduled", 0)
+    pending = total - done - scheduled
     message = f"Summary: {total} tasks — ✅ {done} done • ⏳ {pending} pending • 📅 {scheduled} scheduled."
     return {
         "message": message,
@@ -69,16 +79,17 @@ def summarize_tasks(memory, user_id, scope="all"):
 
 def estimate_effort(memory, user_id, task_ids=None):
 
+    memory = resolve_memory(memory, user_id)
     if not task_ids:
-        tasks = [t for t in memory.list_all() if t.get("status") != "done"]
+        total, tasks_counted = memory.open_effort()
     else:
         tasks = []
         for tid in task_ids:
             t = memory.get_task(tid)
             if t:
                 tasks.append(t.to_dict())
-    total = sum(int(t.get("estimated_minutes", 60)) for t in tasks)
-    tasks_counted = len(tasks)
+        total = sum(int(t.get("estimated_minutes", 60)) for t in tasks)
+        tasks_counted = len(tasks)
     recommended_blocks = max(1, round(total / 90)) if tasks_counted > 0 else 0
     message = f"Estimated pending effort: {total} minutes across {tasks_counted} tasks. Recommended {recommended_blocks} focused blocks (~90min each)."
     return {